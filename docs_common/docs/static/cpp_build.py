@@ -1,7 +1,26 @@
 from typing import List
 import platform
 import pathlib
+import hashlib
+import shutil
+import json
 import os
+import re
+import subprocess
+import threading
+import tempfile
+import time
+import select
+import struct
+import sys
+import zipfile
+import copy
+import shlex
+import math
+import gzip
+import mimetypes
+import http.server
+import concurrent.futures
 
 def path_traverse_up(path: str, count: int) -> str:
     """Traverse the provided path upwards
@@ -24,7 +43,7 @@ def path_traverse_up(path: str, count: int) -> str:
 class BuildSetup:
     def __init__(self, cpp_file_paths: List[str], output_dir: str = path_traverse_up(__file__, 0) + "/bin", deps_dir: str = path_traverse_up(__file__, 0) + "/deps", browser = False):
         # When building c++ projects, this is in general the order the flags should be
-        self.n1_compiler_path = get_default_compiler_path(browser = browser)
+        self.n1_compiler_path = get_default_compiler_path(deps_dir=deps_dir, browser = browser)
         self.n2_cpp_files = '"' + '" "'.join(cpp_file_paths) + '"'
         self.n3_optimization_level = ""
         self.n4_macros = ""
@@ -40,86 +59,2586 @@ class BuildSetup:
         # Where to find dependencies
         self.deps_dir = deps_dir
 
+        # Where the output file and intermediate build files are placed
+        self.cpp_file_paths = list(cpp_file_paths)
+        self.output_dir = output_dir
+
+        # Compile each file to its own object file, and only recompile what changed since the last build
+        self.incremental_build = False
+
+        # How many files to compile at the same time, and if the build should stop at the first compile error
+        self.jobs = os.cpu_count() or 1
+        self.stop_on_first_error = False
+
+        # Reuse object files that were compiled before, from any checkout or project using the same cache
+        self.compile_cache = None
+
+        # Headers that are parsed once into a precompiled header, instead of once for every cpp file
+        self.precompiled_header_paths = []
+
+        # Combine the cpp files into a few larger files, so that each header is only parsed once per batch
+        self.unity_build = False
+        self.unity_batch_count = None
+        self.unity_excluded_file_paths = []
+
+        # Record how long each part of the build takes
+        self.build_timer: BuildTimer = None
+
+        # The name of the optimization profile, see set_profile
+        self.profile_name = None
+
+        # If the program uses threads, in the browser this also requires the page to be cross origin isolated
+        self.pthreads = False
+
+        # Where em++ stores the ports(eg SDL2) and system libraries it has built, see set_emscripten_cache
+        self.emscripten_cache_dir = None
+
+        # A faster linker than the default(eg mold or lld), and if debug information is kept out of the object files, see enable_fast_link
+        self.linker = None
+        self.split_debug_info = False
+
     def include_opengl(self): # Opengl is a cross platform graphics library that also works in the browser(with the right setup)
         add_opengl_flags(self, self.browser_flag)
 
-    def enable_debug(self):
-        self.n4_macros += " -D USE_DEBUG"
+    def enable_debug(self):
+        self.n4_macros += " -D USE_DEBUG"
+
+    def include_asio(self): # Asio is a cross platform networking library to work with sockets etc.
+        extract_dependencies(self.deps_dir, ["asio"])
+        add_asio_flags(self, browser=self.browser_flag)
+
+    def include_glm(self): # Glm is a header only math library for graphics, with vectors and matrices like in glsl
+        extract_dependencies(self.deps_dir, ["glm"])
+        add_glm_flags(self)
+
+    def include_stb(self): # Stb contains single header libraries, such as stb_image.h for loading images
+        extract_dependencies(self.deps_dir, ["stb"])
+        add_stb_flags(self)
+
+    def include_mingw_std_threads(self): # Adds std::thread support for mingw versions that are missing it, used by util_std.hpp
+        extract_dependencies(self.deps_dir, ["mingw-std-threads"])
+        add_mingw_std_threads_flags(self, browser=self.browser_flag)
+
+    def enable_pthreads(self, pool_size = "navigator.hardwareConcurrency"):
+        """Enable threads, eg std::thread. In the browser each thread runs in a web worker
+
+        Parameters
+        ----------
+            pool_size (int or str): Browser only, how many web workers to start before main() runs. 
+                Creating a thread waits for the browser if the pool is empty, which deadlocks if the 
+                main thread then blocks on it(eg join). Defaults to the number of cores
+        """
+        self.pthreads = True
+        add_pthread_flags(self, pool_size=pool_size, browser=self.browser_flag)
+
+    def set_emscripten_cache(self, cache_dir: str):
+        """Let em++ store the ports(eg SDL2 and SDL2_image) and system libraries it builds in cache_dir,
+        so they can be shared between projects or restored in ci containers. See warm_emscripten_cache
+        """
+        if not self.browser_flag:
+            raise Exception("The emscripten cache is only used for browser builds")
+        self.emscripten_cache_dir = os.path.abspath(cache_dir)
+        os.makedirs(self.emscripten_cache_dir, exist_ok=True)
+
+    def get_emscripten_cache_flags(self) -> str:
+        # Passed to each em++ command of this build setup, rather than setting EM_CACHE for the whole process.
+        # Not part of get_compile_cache_flags, so the compile cache keys do not depend on the path
+        if not self.emscripten_cache_dir:
+            return ""
+        return '--cache "' + self.emscripten_cache_dir + '"'
+
+    def warm_emscripten_cache(self, cache_dir: str = None) -> bool:
+        """Build the emscripten ports and system libraries that the current flags need, by building an empty program.
+        Call after all the include_* and enable_* calls and set_profile, since eg -pthread or -flto need other library variants.
+        Does nothing if the cache was already warmed for the same compiler and flags
+
+        Parameters
+        ----------
+            cache_dir (str): Where to store the cache, defaults to the directory set by set_emscripten_cache
+
+        Returns
+        -------
+            bool: True if the cache is ready
+        """
+        if cache_dir:
+            self.set_emscripten_cache(cache_dir)
+        if not self.emscripten_cache_dir:
+            raise Exception("No emscripten cache directory, call set_emscripten_cache first")
+
+        arguments = [
+            self.n1_compiler_path,
+            self.n3_optimization_level,
+            self.n5_additional_compiler_settings,
+        ]
+        flags = " ".join(filter(lambda arg: len(arg) > 0, arguments))
+        stamp_file_path = self.emscripten_cache_dir + "/cpp_build_warmed.json"
+        stamp = hashlib.sha256((get_compiler_identity(self.n1_compiler_path) + "\n" + flags).encode()).hexdigest()
+
+        warmed_stamps = []
+        if os.path.exists(stamp_file_path):
+            with open(stamp_file_path, "r") as file:
+                warmed_stamps = json.load(file)
+        if stamp in warmed_stamps:
+            return True
+
+        print("warming emscripten cache " + self.emscripten_cache_dir)
+        start_time = time.perf_counter()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with open(temp_dir + "/main.cpp", "w") as file:
+                file.write("int main() { return 0; }\n")
+            command = flags + " " + self.get_emscripten_cache_flags() + ' "' + temp_dir + '/main.cpp" -o "' + temp_dir + '/main.html"'
+            print(command)
+            result = run_command_and_measure(command, capture_output=True)
+
+        if result.return_code != 0:
+            print(result.output)
+            return False
+        print(f"warmed emscripten cache in {time.perf_counter() - start_time:.1f}s")
+
+        warmed_stamps.append(stamp)
+        write_json_file(stamp_file_path, warmed_stamps)
+        return True
+
+    def require_toolchain(self, libraries: List[str] = None) -> dict:
+        """Fail fast if the compiler or any of the libraries are missing, the result is cached on disk so this is fast
+
+        Parameters
+        ----------
+            libraries (List[str]): eg ["SDL2", "SDL2_image", "GL"] if using include_opengl
+        """
+        return require_toolchain(deps_dir=self.deps_dir, browser=self.browser_flag, libraries=libraries)
+
+    def setup_dependencies(self, archive_dir: str = None):
+        """Extract all the bundled dependency archives(asio, glm, stb and mingw-std-threads) into deps_dir"""
+        return extract_dependencies(self.deps_dir, archive_dir=archive_dir)
+
+    def set_profile(self, profile_name: str):
+        """Set the optimization flags using a named profile
+
+        - debug: no optimization and debug information
+        - release: optimize for speed, with link time optimization
+        - size: optimize for a small executable, with link time optimization
+        - native: like release, but only runs on cpus with the same features as the one building it. 
+            The cpu is detected when building, in the browser this enables wasm simd instead
+
+        Builds with different profiles place their object files in different directories, so they are never mixed
+        """
+        clang = is_clang_compiler(self.n1_compiler_path)
+        link_time_optimization = "-flto" if clang else "-flto=auto" # Let gcc use multiple cores when linking
+
+        if profile_name == "debug":
+            self.n3_optimization_level = "-O0 -g"
+        elif profile_name == "release":
+            self.n3_optimization_level = "-O2 " + link_time_optimization
+        elif profile_name == "size":
+            # -Oz is the smallest for clang(and em++), gcc does not support it
+            self.n3_optimization_level = ("-Oz " if clang else "-Os ") + link_time_optimization
+        elif profile_name == "native":
+            if self.browser_flag:
+                self.n3_optimization_level = "-O3 " + link_time_optimization + " -msimd128" # Wasm simd, supported by all major browsers
+            else:
+                self.n3_optimization_level = "-O3 " + link_time_optimization + " " + get_native_cpu_flags(self.n1_compiler_path)
+        else:
+            raise Exception("Unknown profile: " + str(profile_name) + ", expected debug, release, size or native")
+
+        if self.browser_flag and profile_name in ["release", "size"]:
+            self.n3_optimization_level += " -msimd128"
+
+        self.profile_name = profile_name
+
+    def enable_fast_link(self, linker: str = None, split_debug_info: bool = True):
+        """Link using the fastest linker that is installed, mold, lld or gold(in that order), instead of the default ld.
+        The available linkers are detected once and cached, see probe_linkers
+
+        Parameters
+        ----------
+            linker (str): Use this linker instead of detecting one, eg "lld"
+            split_debug_info (bool): When building with debug information(eg the debug profile), place it in .dwo files 
+                next to the object files(-gsplit-dwarf), so the linker does not need to copy it. 
+                Not used together with the compile cache, since the cache only stores the object files
+        """
+        if self.browser_flag:
+            return # em++ always links using wasm-ld
+
+        if linker is None:
+            available_linkers = probe_linkers(self.n1_compiler_path)
+            linker = next((name for name in ["mold", "lld", "gold"] if available_linkers.get(name)), None)
+            if linker is None:
+                print("no faster linker found, using the default linker. Consider installing mold or lld")
+        self.linker = linker
+        self.split_debug_info = split_debug_info
+
+    def get_linker_flags(self) -> str:
+        return "-fuse-ld=" + self.linker if self.linker else ""
+
+    def get_debug_info_flags(self) -> str:
+        debug_info = re.search(r"(^|\s)-g", self.n3_optimization_level) is not None
+        # Lto needs the debug information in the object files, since code is generated when linking
+        if self.split_debug_info and debug_info and "-flto" not in self.n3_optimization_level and not self.compile_cache and platform.system() != "Windows":
+            return "-gsplit-dwarf"
+        return ""
+
+    def enable_incremental_build(self):
+        """Compile each cpp file to its own object file in output_dir/obj, and track header dependencies
+        so that only the files that changed (or include a header that changed) are recompiled before relinking
+        """
+        self.incremental_build = True
+
+    def enable_parallel_build(self, jobs: int = None, stop_on_first_error: bool = False):
+        """Compile the cpp files on multiple cores at the same time
+
+        Parameters
+        ----------
+            jobs (int): The number of files to compile at the same time, defaults to the number of cpu cores
+            stop_on_first_error (bool): Do not start compiling any more files after one file fails to compile
+        """
+        # Each file needs to be compiled separately, which is done by the incremental build
+        self.incremental_build = True
+        self.jobs = jobs or os.cpu_count() or 1
+        self.stop_on_first_error = stop_on_first_error
+
+    def generate_build_command(self):
+        arguments = [
+            self.n1_compiler_path, 
+            self.n2_cpp_files,
+            self.n3_optimization_level,
+            self.get_debug_info_flags(),
+            self.n4_macros,
+            self.n5_additional_compiler_settings,
+            self.get_emscripten_cache_flags(),
+            self.get_linker_flags(),
+            self.n6_include_paths,
+            self.n7_library_paths,
+            self.n8_library_files,
+            "-o " + '"' + self.n9_output_file + '"',
+        ]
+
+        # Reomve arguments with length 0
+        arguments = filter(lambda arg: len(arg) > 0, arguments)
+
+        return " ".join(arguments)
+
+    def enable_compile_cache(self, cache_dir: str = None, max_size_mb: int = 5000):
+        """Store compiled object files in a cache shared between checkouts, branches and projects,
+        so that files that were already compiled with the same flags and compiler are never compiled again
+
+        Parameters
+        ----------
+            cache_dir (str): Where to store the cache, defaults to ~/.cache/cpp_build
+            max_size_mb (int): The least recently used objects are removed when the cache grows larger than this
+        """
+        # The cache works per file, which is done by the incremental build
+        self.incremental_build = True
+        self.compile_cache = CompileCache(cache_dir or get_default_compile_cache_dir(), max_size_mb=max_size_mb)
+
+    def enable_precompiled_header(self, header_paths: List[str]):
+        """Parse the headers once into a precompiled header that is reused when compiling each cpp file,
+        the precompiled header is only rebuilt when any of the headers or the flags change
+
+        Parameters
+        ----------
+            header_paths (List[str]): Headers that most files include, eg util_std.hpp or asio.hpp
+        """
+        # The precompiled header is used when compiling each file separately, which is done by the incremental build
+        self.incremental_build = True
+        self.precompiled_header_paths = list(header_paths)
+
+    def enable_unity_build(self, batch_count: int = None, excluded_file_paths: List[str] = None):
+        """Generate a few batch files that each #include a group of the cpp files, and compile those in parallel
+        instead of the cpp files themselves. Mostly useful for clean builds, since changing one file recompiles its whole batch
+
+        Parameters
+        ----------
+            batch_count (int): How many batches to split the files into, defaults to the number of parallel jobs
+            excluded_file_paths (List[str]): Files that do not work when combined with other files(for example because 
+                of conflicting static functions or macros), these are compiled separately
+        """
+        # The batches are compiled as separate files, which is done by the incremental build
+        self.incremental_build = True
+        self.unity_build = True
+        self.unity_batch_count = batch_count
+        self.unity_excluded_file_paths = list(excluded_file_paths or [])
+
+    def get_unity_directory(self):
+        return self.output_dir + "/unity"
+
+    def generate_unity_files(self) -> List[str]:
+        """Write the unity batch files, each including a group of the cpp files
+
+        Returns
+        -------
+            List[str]: The paths of the batch files
+        """
+        excluded_file_paths = set([os.path.abspath(file_path) for file_path in self.unity_excluded_file_paths])
+        included_file_paths = [file_path for file_path in self.cpp_file_paths if os.path.abspath(file_path) not in excluded_file_paths]
+        if len(included_file_paths) == 0:
+            return []
+
+        # Split the files into groups of consecutive files with about the same size
+        batch_count = min(self.unity_batch_count or self.jobs, len(included_file_paths))
+        batches = [included_file_paths[i * len(included_file_paths) // batch_count:(i + 1) * len(included_file_paths) // batch_count] for i in range(batch_count)]
+
+        os.makedirs(self.get_unity_directory(), exist_ok=True)
+        unity_file_paths = []
+        for i, batch in enumerate(batches):
+            unity_file_path = self.get_unity_directory() + "/unity_" + str(i) + ".cpp"
+            unity_file_paths.append(unity_file_path)
+
+            # Only rewrite the file if it changed, otherwise the whole batch would be recompiled
+            contents = "".join(['#include "' + os.path.abspath(file_path).replace("\\", "/") + '"\n' for file_path in batch])
+            previous_contents = None
+            if os.path.exists(unity_file_path):
+                with open(unity_file_path, "r") as file:
+                    previous_contents = file.read()
+            if previous_contents != contents:
+                with open(unity_file_path, "w") as file:
+                    file.write(contents)
+
+        return unity_file_paths
+
+    def get_translation_unit_paths(self) -> List[str]:
+        """Get the cpp files that should be passed to the compiler, one object file is created for each"""
+        if not self.unity_build:
+            return self.cpp_file_paths
+
+        excluded_file_paths = set([os.path.abspath(file_path) for file_path in self.unity_excluded_file_paths])
+        separate_file_paths = [file_path for file_path in self.cpp_file_paths if os.path.abspath(file_path) in excluded_file_paths]
+        return self.generate_unity_files() + separate_file_paths
+
+    def enable_build_timing(self, trace_file_path: str = None, compiler_time_report: bool = True):
+        """Record the wall and cpu time of each part of the build(compiling each file, linking and running the program),
+        and write it as a chrome trace(open it in chrome://tracing or https://ui.perfetto.dev) and a summary of the slowest files
+
+        Parameters
+        ----------
+            trace_file_path (str): Where to write the trace, defaults to output_dir/build_trace.json. 
+                The summary is written next to it as build_summary.txt
+            compiler_time_report (bool): Ask the compiler how long it spent in the frontend(parsing) and backend(optimization and code generation)
+                for each file, using -ftime-report for g++ and -ftime-trace for clang/em++
+        """
+        self.build_timer = BuildTimer(trace_file_path or self.output_dir + "/build_trace.json")
+        self.build_timer.compiler_time_report = compiler_time_report
+
+    def get_compiler_time_report_flags(self):
+        if not self.build_timer or not self.build_timer.compiler_time_report:
+            return ""
+        if is_clang_compiler(self.n1_compiler_path):
+            return "-ftime-trace" # Written next to the object file as a json file
+        return "-ftime-report"
+
+    def get_object_directory(self):
+        if self.profile_name:
+            return self.output_dir + "/obj/" + self.profile_name
+        return self.output_dir + "/obj"
+
+    def get_precompiled_header_directory(self):
+        if self.profile_name:
+            return self.output_dir + "/pch/" + self.profile_name
+        return self.output_dir + "/pch"
+
+    def get_precompiled_header_path(self):
+        """The header that includes all the precompiled headers, passed to the compiler using -include"""
+        return self.get_precompiled_header_directory() + "/pch.hpp"
+
+    def get_precompiled_header_output_path(self):
+        # The compiler looks for the precompiled version next to the header, clang(em++) uses .pch and gcc uses .gch
+        if is_clang_compiler(self.n1_compiler_path):
+            return self.get_precompiled_header_path() + ".pch"
+        else:
+            return self.get_precompiled_header_path() + ".gch"
+
+    def get_precompiled_header_flags(self):
+        if len(self.precompiled_header_paths) == 0:
+            return ""
+        flags = '-include "' + self.get_precompiled_header_path() + '"'
+        if not is_clang_compiler(self.n1_compiler_path):
+            flags += " -Winvalid-pch" # Warn if the precompiled header could not be used
+        return flags
+
+    def generate_precompiled_header_command(self, dependency_file_path: str):
+        arguments = [
+            self.n1_compiler_path,
+            '-x c++-header "' + self.get_precompiled_header_path() + '"',
+            self.n3_optimization_level,
+            self.n4_macros,
+            self.n5_additional_compiler_settings,
+            self.get_emscripten_cache_flags(),
+            self.n6_include_paths,
+            '-MMD -MF "' + dependency_file_path + '"',
+            "-o " + '"' + self.get_precompiled_header_output_path() + '"',
+        ]
+
+        # Reomve arguments with length 0
+        arguments = filter(lambda arg: len(arg) > 0, arguments)
+
+        return " ".join(arguments)
+
+    def build_precompiled_header(self) -> bool:
+        """Build the precompiled header if any of the headers or flags changed since last time
+
+        Returns
+        -------
+            bool: True if the precompiled header is up to date
+        """
+        os.makedirs(self.get_precompiled_header_directory(), exist_ok=True)
+
+        # Only rewrite the header if it changed, otherwise it would trigger a rebuild
+        header_contents = "".join(['#include "' + os.path.abspath(header_path).replace("\\", "/") + '"\n' for header_path in self.precompiled_header_paths])
+        header_path = self.get_precompiled_header_path()
+        previous_contents = None
+        if os.path.exists(header_path):
+            with open(header_path, "r") as file:
+                previous_contents = file.read()
+        if previous_contents != header_contents:
+            with open(header_path, "w") as file:
+                file.write(header_contents)
+
+        output_path = self.get_precompiled_header_output_path()
+        dependency_file_path = self.get_precompiled_header_directory() + "/pch.d"
+        command_file_path = self.get_precompiled_header_directory() + "/pch.cmd"
+        command = self.generate_precompiled_header_command(dependency_file_path)
+        if is_up_to_date(output_path, [header_path], command_file_path, command, dependency_file_path):
+            return True
+
+        print(command)
+        result = run_command_and_measure(command)
+        if self.build_timer:
+            self.build_timer.add_command_result("precompiled header", "compile", result, {"file": output_path})
+        if len(result.output.strip()) > 0:
+            print(result.output.rstrip())
+        if result.return_code != 0:
+            print("failed to build precompiled header " + output_path)
+            return False
+        write_command_file(command_file_path, command)
+        return True
+
+    def get_precompiled_header_hash(self):
+        """Hash the contents of all headers in the precompiled header, 
+        so that the compile cache never reuses an object built against different headers"""
+        header_hash = hashlib.sha256()
+        dependency_file_path = self.get_precompiled_header_directory() + "/pch.d"
+        generated_header_path = os.path.abspath(self.get_precompiled_header_path())
+        for header_path in parse_dependency_file(dependency_file_path):
+            # The generated pch.hpp contains the absolute paths of the headers, which would keep other checkouts from sharing the cache
+            if os.path.abspath(header_path) == generated_header_path:
+                continue
+            with open(header_path, "rb") as file:
+                header_hash.update(file.read())
+        return header_hash.hexdigest()
+
+    def get_object_file_path(self, cpp_file_path: str):
+        # Include a hash of the full path, so files with the same name in different directories do not collide
+        path_hash = hashlib.sha1(os.path.abspath(cpp_file_path).encode()).hexdigest()[:8]
+        file_name = pathlib.Path(cpp_file_path).stem
+        return self.get_object_directory() + "/" + file_name + "_" + path_hash + ".o"
+
+    def generate_compile_command(self, cpp_file_path: str, object_file_path: str, dependency_file_path: str):
+        """Generate the command to compile a single cpp file into an object file, 
+        the compiler also writes the headers it included to the dependency file(a make style depfile)
+        """
+        arguments = [
+            self.n1_compiler_path,
+            '-c "' + cpp_file_path + '"',
+            self.n3_optimization_level,
+            self.get_debug_info_flags(),
+            self.n4_macros,
+            self.n5_additional_compiler_settings,
+            self.get_emscripten_cache_flags(),
+            self.n6_include_paths,
+            self.get_precompiled_header_flags(),
+            '-MMD -MF "' + dependency_file_path + '"',
+            "-o " + '"' + object_file_path + '"',
+        ]
+
+        # Reomve arguments with length 0
+        arguments = filter(lambda arg: len(arg) > 0, arguments)
+
+        return " ".join(arguments)
+
+    def generate_preprocess_command(self, cpp_file_path: str, dependency_file_path: str):
+        """Generate the command to run only the preprocessor on a cpp file, printing the result to stdout"""
+        arguments = [
+            self.n1_compiler_path,
+            '-E "' + cpp_file_path + '"',
+            self.n3_optimization_level,
+            self.n4_macros,
+            self.n5_additional_compiler_settings,
+            self.get_emscripten_cache_flags(),
+            self.n6_include_paths,
+            self.get_precompiled_header_flags(),
+            '-MMD -MF "' + dependency_file_path + '"',
+        ]
+
+        # Reomve arguments with length 0
+        arguments = filter(lambda arg: len(arg) > 0, arguments)
+
+        return " ".join(arguments)
+
+    def get_compile_cache_flags(self):
+        """The flags that affect the contents of the object file, used as part of the compile cache key"""
+        # The include paths only affect which headers are found, which is already part of the preprocessed source.
+        # Leaving them out means checkouts in different directories can share the cache
+        include_flags = re.findall(r'-I\s*(?:"[^"]*"|\S+)', self.n6_include_paths)
+        other_include_settings = self.n6_include_paths
+        for include_flag in include_flags:
+            other_include_settings = other_include_settings.replace(include_flag, "")
+
+        cache_flags = [
+            get_compiler_identity(self.n1_compiler_path),
+            self.n3_optimization_level,
+            self.n4_macros,
+            self.n5_additional_compiler_settings,
+            other_include_settings.strip(),
+        ]
+        if len(self.precompiled_header_paths) > 0:
+            cache_flags.append(self.get_precompiled_header_hash())
+        # The debug information contains the working directory and the paths of the source files, 
+        # so objects built with it can only be reused from the same directory(like hash_dir in ccache)
+        if self.has_debug_info():
+            cache_flags.append(os.getcwd())
+        return "\n".join(cache_flags)
+
+    def has_debug_info(self) -> bool:
+        return re.search(r"(^|\s)-g", self.n3_optimization_level + " " + self.n5_additional_compiler_settings) is not None
+
+    def generate_link_command(self, object_file_paths: List[str]):
+        arguments = [
+            self.n1_compiler_path,
+            '"' + '" "'.join(object_file_paths) + '"',
+            self.n3_optimization_level,
+            self.n5_additional_compiler_settings,
+            self.get_emscripten_cache_flags(),
+            self.get_linker_flags(),
+            self.n7_library_paths,
+            self.n8_library_files,
+            "-o " + '"' + self.n9_output_file + '"',
+        ]
+
+        # Reomve arguments with length 0
+        arguments = filter(lambda arg: len(arg) > 0, arguments)
+
+        return " ".join(arguments)
+
+    def get_compile_jobs(self) -> List["CompileJob"]:
+        """Get one compile job for each cpp file, compiling it into an object file"""
+        compile_jobs = []
+        cache_flags = self.get_compile_cache_flags() if self.compile_cache else None
+        for cpp_file_path in self.get_translation_unit_paths():
+            object_file_path = self.get_object_file_path(cpp_file_path)
+            dependency_file_path = object_file_path[:-2] + ".d"
+            compile_command = self.generate_compile_command(cpp_file_path, object_file_path, dependency_file_path)
+            compile_job = CompileJob(cpp_file_path, object_file_path, dependency_file_path, compile_command)
+            compile_job.time_report_flags = self.get_compiler_time_report_flags()
+            if len(self.precompiled_header_paths) > 0:
+                compile_job.input_paths.append(self.get_precompiled_header_output_path())
+            if self.compile_cache:
+                compile_job.compile_cache = self.compile_cache
+                compile_job.preprocess_command = self.generate_preprocess_command(cpp_file_path, dependency_file_path)
+                compile_job.cache_flags = cache_flags
+                if self.has_debug_info():
+                    compile_job.cache_flags += "\n" + path_traverse_up(os.path.abspath(cpp_file_path), 0)
+            compile_jobs.append(compile_job)
+        return compile_jobs
+
+    def build_incremental(self) -> bool:
+        """Compile the cpp files that are out of date into object files, and relink if anything changed
+
+        Returns
+        -------
+            bool: True if the build succeeded
+        """
+        if not self.prepare_incremental_build():
+            return False
+
+        compile_jobs = self.get_compile_jobs()
+        object_file_paths = [compile_job.object_file_path for compile_job in compile_jobs]
+
+        # Only compile the files that changed since last time
+        compile_jobs = [compile_job for compile_job in compile_jobs if not compile_job.is_up_to_date()]
+        compile_succeeded = run_compile_jobs(compile_jobs, jobs=self.jobs, stop_on_first_error=self.stop_on_first_error, build_timer=self.build_timer)
+
+        if self.compile_cache and len(compile_jobs) > 0:
+            self.compile_cache.remove_least_recently_used()
+            self.compile_cache.print_stats()
+            self.compile_cache.save_stats()
+
+        if not compile_succeeded:
+            return False
+
+        return self.link(object_file_paths)
+
+    def prepare_incremental_build(self) -> bool:
+        """Create the object directory and build the precompiled header, needs to be done before compiling the files"""
+        os.makedirs(self.get_object_directory(), exist_ok=True)
+
+        if len(self.precompiled_header_paths) > 0:
+            if not self.build_precompiled_header():
+                return False
+        return True
+
+    def link(self, object_file_paths: List[str], print_lock: threading.Lock = None) -> bool:
+        """Link the object files into the output file, if any of them changed since last time
+
+        Parameters
+        ----------
+            object_file_paths (List[str]): The object files to link
+            print_lock (threading.Lock): Set when linking several outputs at the same time, what the linker prints 
+                is then captured and printed all at once while holding the lock, so it is not mixed up with other output
+        """
+        link_command = self.generate_link_command(object_file_paths)
+        # Keep the link command per output file rather than per profile, so that switching profiles always relinks
+        command_file_path = self.output_dir + "/obj/" + pathlib.Path(self.n9_output_file).name + ".link.cmd"
+        if is_up_to_date(self.n9_output_file, object_file_paths, command_file_path, link_command):
+            with print_lock or threading.Lock():
+                print(self.n9_output_file + " is up to date")
+            return True
+
+        # Run the link command
+        if print_lock is None:
+            print(link_command)
+        result = run_command_and_measure(link_command, capture_output=(print_lock is not None))
+        if self.build_timer:
+            self.build_timer.add_command_result("link", "link", result, {"file": self.n9_output_file})
+
+        with print_lock or threading.Lock():
+            if print_lock is not None:
+                print(link_command)
+                if len(result.output.strip()) > 0:
+                    print(result.output.rstrip())
+            if result.return_code != 0:
+                print("failed to link " + self.n9_output_file)
+                return False
+            print(f"linked {self.n9_output_file} in {result.wall_time:.2f}s using {self.linker or 'the default linker'}")
+        write_command_file(command_file_path, link_command)
+        return True
+
+    def build(self) -> bool:
+        """Build the output file
+
+        Returns
+        -------
+            bool: True if the build succeeded
+        """
+        if self.incremental_build:
+            build_succeeded = self.build_incremental()
+            # Keep the trace from the last build that did something, instead of overwriting it with an empty one
+            if self.build_timer and self.build_timer.has_unsaved_events():
+                self.build_timer.save()
+        else:
+            build_command = self.generate_build_command()
+
+            # Remove the output file if it exists already
+            if os.path.exists(self.n9_output_file):
+                os.remove(self.n9_output_file)
+
+            # Run the build command
+            print(build_command)
+            if self.build_timer:
+                result = run_command_and_measure(build_command, capture_output=False)
+                self.build_timer.add_command_result("build", "compile", result, {"file": self.n9_output_file})
+                self.build_timer.save()
+            else:
+                run_command(build_command)
+
+            build_succeeded = os.path.exists(self.n9_output_file)
+
+        # Compress the files once here, instead of on every request to the local server
+        if build_succeeded and self.browser_flag:
+            precompress_files(self.output_dir)
+        return build_succeeded
+
+    def build_and_run(self, profile: bool = False):
+        """Build and run the output file
+
+        Parameters
+        ----------
+            profile (bool): Instead build with profiling friendly flags, run under a profiler and write a flame graph, see build_and_profile
+        """
+        if profile:
+            self.build_and_profile()
+            return
+
+        self.build()
+
+        # Only add the run to a trace that was written by this build
+        if self.build_timer and self.build_timer.saved_event_count > 0:
+            start_time = time.perf_counter()
+            invoke_file(self.n9_output_file, cross_origin_isolated=self.pthreads)
+            self.build_timer.add_event("run", "run", start_time, time.perf_counter() - start_time, args={"file": self.n9_output_file})
+            self.build_timer.save(print_summary=False)
+        else:
+            invoke_file(self.n9_output_file, cross_origin_isolated=self.pthreads)
+
+    def copy_with_output_dir(self, output_dir: str) -> "BuildSetup":
+        """Create a copy of the build setup with the same flags, that builds into another directory"""
+        build_setup = copy.copy(self)
+        build_setup.output_dir = output_dir
+        build_setup.n9_output_file = output_dir + "/" + pathlib.Path(self.n9_output_file).name
+        return build_setup
+
+    def build_with_pgo(self, training_commands: List[str] = None, compare_runtime: bool = True) -> str:
+        """Build an optimized executable using profile guided optimization(pgo)
+
+        1. Build an instrumented executable, that records which code paths are used
+        2. Run the training commands using the instrumented executable, to collect a profile
+        3. Build the executable again, letting the compiler optimize for the collected profile
+
+        The profile is reused until any of the source files, headers, flags or training commands change.
+        Everything is placed in output_dir/pgo
+
+        Parameters
+        ----------
+            training_commands (List[str]): Commands that run a typical workload, where {executable} is replaced with 
+                the path to the executable, eg ["{executable} --input data/level1.txt", "{executable} --benchmark"]. 
+                Defaults to running the executable without arguments
+            compare_runtime (bool): Also build the executable without pgo, and print the runtime of the training commands for both
+
+        Returns
+        -------
+            str: The path to the optimized executable, or None if the build failed
+        """
+        if self.browser_flag:
+            raise Exception("Profile guided optimization is not supported for the browser")
+        training_commands = training_commands or ["{executable}"]
+
+        pgo_dir = self.output_dir + "/pgo"
+        profile_dir = pgo_dir + "/profile"
+        stamp_file_path = pgo_dir + "/profile.stamp"
+        executable_name = pathlib.Path(self.n9_output_file).name
+        optimization_level = self.n3_optimization_level if len(self.n3_optimization_level.strip()) > 0 else "-O2"
+        clang = is_clang_compiler(self.n1_compiler_path)
+
+        # The instrumented and optimized builds use the same object files, since gcc finds the profile of
+        # each file using the path of the object file
+        pgo_build = self.copy_with_output_dir(pgo_dir)
+        pgo_build.incremental_build = True
+        pgo_build.compile_cache = None # The profile is not part of the cache key
+
+        previous_stamp = None
+        if os.path.exists(stamp_file_path):
+            with open(stamp_file_path, "r") as file:
+                previous_stamp = file.read()
+        if previous_stamp != pgo_build.get_pgo_stamp(training_commands, optimization_level):
+            print("the pgo profile is missing or out of date, building instrumented executable")
+            shutil.rmtree(profile_dir, ignore_errors=True)
+            os.makedirs(profile_dir)
+
+            pgo_build.n3_optimization_level = optimization_level + ' -fprofile-generate="' + profile_dir + '"'
+            if not clang:
+                pgo_build.n3_optimization_level += " -fprofile-update=prefer-atomic" # Correct counts for multithreaded programs
+            pgo_build.n9_output_file = pgo_dir + "/instrumented_" + executable_name
+            if not pgo_build.build():
+                return None
+
+            print("collecting profile")
+            if run_training_commands(pgo_build.n9_output_file, training_commands) is None:
+                return None
+
+            if clang:
+                # Clang writes raw profiles that need to be merged before they can be used
+                profraw_file_paths = ['"' + profile_dir + "/" + file_name + '"' for file_name in os.listdir(profile_dir) if file_name.endswith(".profraw")]
+                merge_command = get_llvm_profdata_path(self.n1_compiler_path) + ' merge -output="' + profile_dir + '/default.profdata" ' + " ".join(profraw_file_paths)
+                print(merge_command)
+                if run_command(merge_command) != 0:
+                    print("failed to merge the pgo profile")
+                    return None
+
+            write_command_file(stamp_file_path, pgo_build.get_pgo_stamp(training_commands, optimization_level))
+
+        if clang:
+            pgo_build.n3_optimization_level = optimization_level + ' -fprofile-use="' + profile_dir + '/default.profdata"'
+        else:
+            pgo_build.n3_optimization_level = optimization_level + ' -fprofile-use="' + profile_dir + '" -fprofile-correction -Wno-missing-profile'
+        pgo_build.n9_output_file = pgo_dir + "/optimized_" + executable_name
+        if not pgo_build.build():
+            return None
+
+        if compare_runtime:
+            baseline_build = self.copy_with_output_dir(pgo_dir + "/baseline")
+            baseline_build.incremental_build = True
+            baseline_build.n3_optimization_level = optimization_level
+            if baseline_build.build():
+                print("running training commands without pgo")
+                baseline_time = run_training_commands(baseline_build.n9_output_file, training_commands)
+                print("running training commands with pgo")
+                pgo_time = run_training_commands(pgo_build.n9_output_file, training_commands)
+                if baseline_time and pgo_time:
+                    print(f"training runtime without pgo: {baseline_time:.3f}s, with pgo: {pgo_time:.3f}s ({baseline_time / pgo_time:.2f}x speedup)")
+
+        print("pgo executable: " + pgo_build.n9_output_file)
+        return pgo_build.n9_output_file
+
+    def build_and_benchmark(self, arguments: str = "", runs: int = 10, warmup_runs: int = 2, baseline_file_path: str = None, 
+                            save_baseline: bool = False, regression_threshold: float = 0.05) -> dict:
+        """Build the executable and benchmark it, see benchmark_executable
+
+        The baseline defaults to output_dir/benchmark_baseline.json
+        """
+        if self.browser_flag:
+            raise Exception("Benchmarking is not supported for the browser")
+        if not self.build():
+            return None
+        return benchmark_executable(self.n9_output_file, arguments=arguments, runs=runs, warmup_runs=warmup_runs,
+                                    baseline_file_path=baseline_file_path or self.output_dir + "/benchmark_baseline.json",
+                                    save_baseline=save_baseline, regression_threshold=regression_threshold)
+
+    def build_and_profile(self, arguments: str = "", profiler: str = None, frequency: int = 999) -> str:
+        """Build with frame pointers and debug information, run the executable under a profiler, 
+        and write the collapsed stacks and a flame graph svg next to the executable
+
+        The build is placed in output_dir/profile/<profile name>, and the output files are tagged with the profile name, 
+        eg run.out.release.svg. See profile_executable
+
+        Parameters
+        ----------
+            arguments (str): Command line arguments for the executable
+            profiler (str): "perf" or "callgrind", defaults to perf if it is installed
+            frequency (int): How many times per second perf samples the call stacks
+
+        Returns
+        -------
+            str: The path to the flame graph svg, or None if the build or profiling failed
+        """
+        if self.browser_flag:
+            raise Exception("Profiling is not supported for the browser, use the performance tab of the browser instead")
+
+        profile_tag = self.profile_name or "default"
+        profile_build = self.copy_with_output_dir(self.output_dir + "/profile/" + profile_tag)
+        # Frame pointers let perf walk the call stacks cheaply, and the debug information gives the function names of inlined code
+        profile_build.n3_optimization_level = (self.n3_optimization_level + " -g -fno-omit-frame-pointer").strip()
+        if not profile_build.build():
+            return None
+        return profile_executable(profile_build.n9_output_file, arguments=arguments, profile_tag=profile_tag, profiler=profiler, frequency=frequency)
+
+    def analyze_includes(self, report_count: int = 20, json_path: str = None, min_cost_fraction: float = 0.05) -> dict:
+        """Find the headers that make the cpp files slow to compile
+
+        Each cpp file is preprocessed to find which headers it includes(directly or through other headers) and 
+        how large each of them is after preprocessing, and parsed(-fsyntax-only) to measure how long it takes. 
+        The parse time of each file is split between its headers in proportion to their preprocessed size.
+        Prints the most expensive headers, and which are worth moving into a precompiled header, or out of a 
+        commonly included header(eg <regex> in util_std.hpp) into only the cpp files that use them
+
+        Parameters
+        ----------
+            report_count (int): How many headers to print
+            json_path (str): Also write the full report as json
+            min_cost_fraction (float): Only recommend headers that cost at least this fraction of the total parse time
+
+        Returns
+        -------
+            dict: headers(path -> statistics), translation_units and recommendations
+        """
+        def analyze_file(cpp_file_path: str) -> dict:
+            arguments = [self.n1_compiler_path, self.n3_optimization_level, self.n4_macros, self.n5_additional_compiler_settings, self.get_emscripten_cache_flags(), self.n6_include_paths]
+            flags = " ".join(filter(lambda arg: len(arg) > 0, arguments))
+            process = subprocess.run(flags + ' -E "' + cpp_file_path + '"', shell=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            if process.returncode != 0:
+                raise Exception("failed to preprocess " + cpp_file_path)
+            translation_unit = parse_preprocessed_includes(process.stdout.decode(errors="replace"))
+            translation_unit["file"] = cpp_file_path
+            translation_unit["parse_time"] = run_command_and_measure(flags + ' -fsyntax-only "' + cpp_file_path + '"').wall_time
+            return translation_unit
+
+        print(f"analyzing the includes of {len(self.cpp_file_paths)} files")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            translation_units = list(executor.map(analyze_file, self.cpp_file_paths))
+
+        report = get_include_report(translation_units, precompiled_header_paths=self.precompiled_header_paths, min_cost_fraction=min_cost_fraction)
+        print_include_report(report, report_count=report_count)
+        if json_path:
+            write_json_file(json_path, report)
+        return report
+
+    def get_pgo_stamp(self, training_commands: List[str], optimization_level: str) -> str:
+        """A hash of everything the pgo profile depends on, the profile needs to be collected again if it changes.
+        optimization_level is the -O level and profile flags without the pgo flags, since the instrumented build adds its own"""
+        stamp_hash = hashlib.sha256()
+        for flags in [self.n1_compiler_path, optimization_level, self.profile_name or "", self.n4_macros, self.n5_additional_compiler_settings, self.n6_include_paths, self.n7_library_paths, self.n8_library_files]:
+            stamp_hash.update(flags.encode() + b"\0")
+        for training_command in training_commands:
+            stamp_hash.update(training_command.encode() + b"\0")
+        for file_path in self.get_watched_file_paths():
+            stamp_hash.update(file_path.encode() + b"\0")
+            if os.path.exists(file_path):
+                stamp_hash.update(get_file_hash(file_path).encode())
+        return stamp_hash.hexdigest()
+
+    def get_watched_file_paths(self) -> List[str]:
+        """Get the cpp files and all the headers they included during the last build"""
+        file_paths = set([os.path.abspath(file_path) for file_path in self.cpp_file_paths + self.precompiled_header_paths])
+        dependency_file_paths = [compile_job.dependency_file_path for compile_job in self.get_compile_jobs()]
+        dependency_file_paths.append(self.get_precompiled_header_directory() + "/pch.d")
+        for dependency_file_path in dependency_file_paths:
+            if os.path.exists(dependency_file_path):
+                file_paths.update([os.path.abspath(file_path) for file_path in parse_dependency_file(dependency_file_path)])
+
+        # Files generated by the build, such as the unity batch files, are rewritten by the build itself
+        output_dir = os.path.abspath(self.output_dir) + os.sep
+        return sorted([file_path for file_path in file_paths if not file_path.startswith(output_dir)])
+
+    def watch_and_run(self, debounce_seconds: float = 0.2, poll_interval: float = 0.5):
+        """Build and run the program, then rebuild and restart it every time a source file or header changes. Stop using ctrl+c
+
+        The program is killed and started again after each successful build, 
+        for the browser the html page is opened again. If the build fails, the program keeps running
+
+        Parameters
+        ----------
+            debounce_seconds (float): Wait until no files have changed for this long before rebuilding, 
+                so that saving many files at once only triggers one build
+            poll_interval (float): How often to check the files for changes, if inotify is not available(eg on windows)
+        """
+        # Only rebuild what changed
+        self.incremental_build = True
+
+        # Start watching before building, so that files saved during the build trigger another build
+        file_watcher = FileWatcher(self.get_watched_file_paths(), poll_interval=poll_interval)
+        build_succeeded = self.build()
+        file_watcher.set_file_paths(self.get_watched_file_paths())
+        program = RunningProgram(self.n9_output_file, cross_origin_isolated=self.pthreads)
+        if build_succeeded:
+            program.restart()
+
+        try:
+            while True:
+                print("watching " + str(len(file_watcher.file_paths)) + " files for changes...")
+                changed_file_paths = file_watcher.wait_for_changes(debounce_seconds=debounce_seconds)
+                print("changed: " + ", ".join(changed_file_paths))
+
+                if self.build():
+                    program.restart()
+
+                # New headers may have been included
+                file_watcher.set_file_paths(self.get_watched_file_paths())
+        except KeyboardInterrupt:
+            print("stopped watching")
+        finally:
+            program.stop()
+            file_watcher.close()
+
+
+def get_default_output_file(browser = False):
+    platform_name = platform.system()
+
+    if not browser:
+        if platform_name == "Windows": # Windows
+            return "run.exe"
+
+        elif platform_name == "Linux": # Linux
+            return "run.out"
+
+        else:
+            raise NotImplementedError()
+        
+    else:
+        return "run.html"
+
+
+def run_command(command: str) -> int:
+    """Run a command in the terminal, returns the exit status of the command"""
+    platform_name = platform.system()
+    if platform_name == "Windows": # Windows
+        if command[0] != '"':
+            return os.system(f'powershell; {command}')
+        else:
+            return os.system(f'powershell; &{command}')
+    else:
+        return os.system(command)
+
+
+class CompileJob:
+    """Compile a single cpp file into an object file"""
+    def __init__(self, cpp_file_path: str, object_file_path: str, dependency_file_path: str, command: str):
+        self.cpp_file_path = cpp_file_path
+        self.object_file_path = object_file_path
+        self.dependency_file_path = dependency_file_path
+        self.command_file_path = object_file_path[:-2] + ".cmd" # Used to detect when the flags change
+        self.command = command
+        self.input_paths = [cpp_file_path] # The dependency file lists the rest of the inputs
+        # Added when running the command but left out of the command file, so turning the time report on or off does not trigger a rebuild
+        self.time_report_flags = ""
+
+        # Set when the object file should be looked up in a compile cache before compiling
+        self.compile_cache: CompileCache = None
+        self.preprocess_command: str = None
+        self.cache_flags: str = None
+        self.cache_hit = False
+
+    def is_up_to_date(self) -> bool:
+        return is_up_to_date(self.object_file_path, self.input_paths, self.command_file_path, self.command, self.dependency_file_path)
+
+    def get_run_command(self) -> str:
+        if len(self.time_report_flags) > 0:
+            return self.command + " " + self.time_report_flags
+        return self.command
+
+    def run(self) -> "CommandResult":
+        """Run the compile command, returns the exit status of the compiler and everything it printed"""
+        if self.compile_cache:
+            result = self.compile_cache.compile(self)
+        else:
+            result = run_command_and_measure(self.get_run_command())
+        if result.return_code == 0:
+            write_command_file(self.command_file_path, self.command)
+        return result
+
+
+def run_compile_jobs(compile_jobs: List[CompileJob], jobs: int = None, stop_on_first_error: bool = False, build_timer: "BuildTimer" = None) -> bool:
+    """Run the compile jobs on multiple cores
+
+    The output of each compiler invocation is captured and printed together once the file is done, 
+    so that errors from different files do not get mixed up with each other
+
+    Parameters
+    ----------
+        compile_jobs (List[CompileJob]): The files to compile
+        jobs (int): How many files to compile at the same time, defaults to the number of cpu cores
+        stop_on_first_error (bool): Do not start compiling any more files after the first failure
+        build_timer (BuildTimer): Record how long each file took to compile
+
+    Returns
+    -------
+        bool: True if all files compiled successfully
+    """
+    if len(compile_jobs) == 0:
+        return True
+
+    jobs = jobs or os.cpu_count() or 1
+    print_lock = threading.Lock()
+    stop_event = threading.Event()
+    failed_files = []
+    finished_count = [0]
+
+    def compile_file(compile_job: CompileJob):
+        if stop_event.is_set():
+            return
+        result = compile_job.run()
+        output = result.output
+        if build_timer:
+            output = build_timer.add_compile_result(compile_job, result)
+        with print_lock:
+            finished_count[0] += 1
+            print_compile_result(compile_job, result.return_code, output, f"[{finished_count[0]}/{len(compile_jobs)}] ")
+            if result.return_code != 0:
+                failed_files.append(compile_job.cpp_file_path)
+                if stop_on_first_error:
+                    stop_event.set()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        for _ in executor.map(compile_file, compile_jobs):
+            pass
+
+    if len(failed_files) > 0:
+        print(str(len(failed_files)) + " file(s) failed to compile:")
+        for failed_file in failed_files:
+            print("    " + failed_file)
+        return False
+    return True
+
+
+def print_compile_result(compile_job: CompileJob, return_code: int, output: str, progress: str = ""):
+    if compile_job.cache_hit:
+        print(progress + "compile cache hit: " + compile_job.cpp_file_path)
+    else:
+        print(progress + compile_job.get_run_command())
+    if return_code != 0:
+        print("========== failed to compile " + compile_job.cpp_file_path + " ==========")
+    if len(output.strip()) > 0:
+        print(output.rstrip())
+
+
+def build_matrix(cpp_file_paths: List[str], targets: List[str] = None, profiles: List[str] = None, 
+                 output_dir: str = path_traverse_up(__file__, 0) + "/bin", deps_dir: str = path_traverse_up(__file__, 0) + "/deps", 
+                 configure = None, jobs: int = None, compile_cache: "CompileCache" = None) -> dict:
+    """Build every combination of target and profile at the same time, sharing one pool of workers and one compile cache
+
+    Each combination is built into output_dir/<target>-<profile>, eg bin/browser-release/run.html
+
+    Parameters
+    ----------
+        cpp_file_paths (List[str]): The files to build
+        targets (List[str]): "native" and/or "browser", defaults to both
+        profiles (List[str]): The optimization profiles to build, see BuildSetup.set_profile. Defaults to debug and release
+        configure: Called with each BuildSetup before building, eg lambda build_setup: build_setup.include_opengl()
+        jobs (int): How many files to compile at the same time, defaults to the number of cpu cores
+        compile_cache (CompileCache): The compile cache shared by all combinations, defaults to the cache in get_default_compile_cache_dir()
+
+    Returns
+    -------
+        dict: "<target>-<profile>" -> True if that combination built successfully
+    """
+    targets = targets or ["native", "browser"]
+    profiles = profiles or ["debug", "release"]
+    compile_cache = compile_cache or CompileCache(get_default_compile_cache_dir())
+    build_setups = dict()
+    for target in targets:
+        if target not in ["native", "browser"]:
+            raise Exception("Unknown target: " + str(target) + ", expected native or browser")
+        for profile in profiles:
+            name = target + "-" + profile
+            build_setup = BuildSetup(cpp_file_paths, output_dir=output_dir + "/" + name, deps_dir=deps_dir, browser=(target == "browser"))
+            build_setup.incremental_build = True
+            build_setup.set_profile(profile)
+            if configure:
+                configure(build_setup)
+            build_setup.compile_cache = compile_cache
+            build_setups[name] = build_setup
+
+    results = dict([(name, False) for name in build_setups])
+    print_lock = threading.Lock()
+
+    def get_result(future: concurrent.futures.Future, name: str):
+        """The result of a step for one combination, an exception only makes that combination fail"""
+        try:
+            return future.result()
+        except Exception as e:
+            with print_lock:
+                print(f"{name} failed: {type(e).__name__}: {e}")
+            return None
+
+    def link(name: str) -> bool:
+        build_setup = build_setups[name]
+        if not build_setup.link(object_file_paths[name], print_lock):
+            return False
+        # Compress the files once here, like BuildSetup.build does
+        if build_setup.browser_flag:
+            precompress_files(build_setup.output_dir)
+        return True
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as executor:
+        # Build the precompiled headers first, since the compile jobs depend on them
+        prepare_futures = dict([(name, executor.submit(build_setup.prepare_incremental_build)) for name, build_setup in build_setups.items()])
+        prepared_setups = [name for name in build_setups if get_result(prepare_futures[name], name)]
+
+        # Compile the files that changed
+        object_file_paths = dict()
+        remaining_jobs = dict()
+        failed = set()
+        futures = dict() # future -> (name, compile job)
+        for name in prepared_setups:
+            try:
+                compile_jobs = build_setups[name].get_compile_jobs()
+                compile_jobs_to_run = [compile_job for compile_job in compile_jobs if not compile_job.is_up_to_date()]
+            except Exception as e:
+                with print_lock:
+                    print(f"{name} failed: {type(e).__name__}: {e}")
+                failed.add(name)
+                continue
+            object_file_paths[name] = [compile_job.object_file_path for compile_job in compile_jobs]
+            remaining_jobs[name] = len(compile_jobs_to_run)
+            for compile_job in compile_jobs_to_run:
+                futures[executor.submit(compile_job.run)] = (name, compile_job)
+        compiled_count = len(futures)
+
+        # Link each combination as soon as all its files are compiled
+        link_futures = dict()
+        for name in prepared_setups:
+            if name not in failed and remaining_jobs[name] == 0:
+                link_futures[name] = executor.submit(link, name)
+
+        while len(futures) > 0:
+            done_futures, _ = concurrent.futures.wait(list(futures.keys()), return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done_futures:
+                name, compile_job = futures.pop(future)
+                result = get_result(future, name)
+                if result is None:
+                    failed.add(name)
+                else:
+                    with print_lock:
+                        print_compile_result(compile_job, result.return_code, result.output, "")
+                    if result.return_code != 0:
+                        failed.add(name)
+
+                remaining_jobs[name] -= 1
+                if remaining_jobs[name] == 0 and name not in failed:
+                    link_futures[name] = executor.submit(link, name)
+
+        for name, link_future in link_futures.items():
+            results[name] = bool(get_result(link_future, name))
+
+    if compiled_count > 0:
+        compile_cache.remove_least_recently_used()
+        compile_cache.print_stats()
+        compile_cache.save_stats()
+
+    for name, succeeded in results.items():
+        print(("built " if succeeded else "failed to build ") + build_setups[name].n9_output_file)
+    return results
+
+
+class CompileCache:
+    """A local cache of object files, keyed on a hash of the preprocessed source, 
+    the compiler flags and the compiler identity
+
+    The same cache directory can be shared between checkouts, branches and build directories.
+    When the cache grows larger than its max size, the least recently used objects are removed
+    """
+    def __init__(self, cache_dir: str, max_size_mb: int = 5000):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.get_objects_directory(), exist_ok=True)
+
+    def get_objects_directory(self):
+        return self.cache_dir + "/objects"
+
+    def get_entry_path(self, key: str):
+        return self.get_objects_directory() + "/" + key[:2] + "/" + key + ".o"
+
+    def get_key(self, preprocessed_source: bytes, cache_flags: str):
+        key_hash = hashlib.sha256()
+        key_hash.update(cache_flags.encode())
+        key_hash.update(b"\0")
+        for line in preprocessed_source.splitlines():
+            # Skip line markers such as '# 12 "/path/to/file.cpp"', since they contain the path of the checkout
+            if line.startswith(b"# ") and line[2:3].isdigit():
+                continue
+            key_hash.update(line)
+            key_hash.update(b"\n")
+        return key_hash.hexdigest()
+
+    def get(self, key: str, object_file_path: str) -> bool:
+        """Copy the cached object file to object_file_path, returns False if it is not in the cache"""
+        entry_path = self.get_entry_path(key)
+        try:
+            shutil.copyfile(entry_path, object_file_path)
+            os.utime(entry_path) # Mark as recently used
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return False
+
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def put(self, key: str, object_file_path: str):
+        entry_path = self.get_entry_path(key)
+        os.makedirs(path_traverse_up(entry_path, 0), exist_ok=True)
+
+        # Write to a temporary file first, so that other builds never see a partially written object
+        temporary_path = entry_path + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+        shutil.copyfile(object_file_path, temporary_path)
+        os.replace(temporary_path, entry_path)
+
+    def compile(self, compile_job: "CompileJob") -> "CommandResult":
+        """Get the object file from the cache, or compile it and add it to the cache"""
+        # Running the preprocessor also writes the dependency file, so it is up to date even on a cache hit
+        start_time = time.perf_counter()
+        preprocess_result = subprocess.run(compile_job.preprocess_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if preprocess_result.returncode != 0:
+            # Let the compiler report the error
+            return run_command_and_measure(compile_job.get_run_command())
+
+        key = self.get_key(preprocess_result.stdout, compile_job.cache_flags)
+        if self.get(key, compile_job.object_file_path):
+            compile_job.cache_hit = True
+            result = CommandResult()
+            result.wall_time = time.perf_counter() - start_time
+            return result
+
+        result = run_command_and_measure(compile_job.get_run_command())
+        if result.return_code == 0:
+            self.put(key, compile_job.object_file_path)
+        return result
+
+    def remove_least_recently_used(self):
+        """Remove the least recently used objects until the cache is smaller than its max size"""
+        entries = []
+        total_size = 0
+        for directory_path, _, file_names in os.walk(self.get_objects_directory()):
+            for file_name in file_names:
+                entry_path = directory_path + "/" + file_name
+                try:
+                    entry_stat = os.stat(entry_path)
+                except FileNotFoundError:
+                    continue # Removed by another build
+                entries.append((entry_stat.st_mtime, entry_stat.st_size, entry_path))
+                total_size += entry_stat.st_size
+
+        entries.sort()
+        for _, entry_size, entry_path in entries:
+            if total_size <= self.max_size_bytes:
+                break
+            try:
+                os.remove(entry_path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            total_size -= entry_size
+
+    def get_stats_file_path(self):
+        return self.cache_dir + "/stats.json"
+
+    def save_stats(self):
+        """Add the hits and misses since the last save to the total stats stored in the cache directory"""
+        with self._lock:
+            total_stats = self.load_stats()
+            total_stats["hits"] += self.hits
+            total_stats["misses"] += self.misses
+            total_stats["evictions"] += self.evictions
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+        temporary_path = self.get_stats_file_path() + "." + str(os.getpid()) + ".tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(total_stats, file, indent=4)
+        os.replace(temporary_path, self.get_stats_file_path())
+
+    def load_stats(self) -> dict:
+        stats = {"hits": 0, "misses": 0, "evictions": 0}
+        try:
+            with open(self.get_stats_file_path(), "r") as file:
+                stats.update(json.load(file))
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+        return stats
+
+    def print_stats(self):
+        """Print the hits and misses since the last save, and the total for the cache directory"""
+        total_stats = self.load_stats()
+        total_hits = total_stats["hits"] + self.hits
+        total_lookups = total_hits + total_stats["misses"] + self.misses
+        total_hit_rate = 100 * total_hits / total_lookups if total_lookups > 0 else 0
+        print(f"compile cache: {self.hits} hits, {self.misses} misses, {self.evictions} evictions " + 
+              f"(total {total_hit_rate:.1f}% hit rate over {total_lookups} lookups)")
+
+
+def is_clang_compiler(compiler_path: str) -> bool:
+    """Check if the compiler is clang based, em++ for the browser uses clang"""
+    compiler_name = compiler_path.replace("\\", "/").strip('"').rsplit("/", maxsplit=1)[-1]
+    return "clang" in compiler_name or compiler_name.startswith("em++")
+
+
+def get_native_cpu_flags(compiler_path: str) -> str:
+    """Detect the cpu of this computer, eg "-march=znver3"
+    
+    This is used instead of -march=native, so that the actual cpu is part of the flags(and the compile cache key)
+    """
+    return probe_compiler(compiler_path)["native_cpu_flags"]
+
+
+def detect_native_cpu_flags(compiler_path: str) -> str:
+    native_cpu_flags = "-march=native"
+    if is_clang_compiler(compiler_path):
+        # eg: "-cc1" "-triple" "x86_64-pc-linux-gnu" ... "-target-cpu" "znver3"
+        return_code, output = run_command_and_capture_output(compiler_path + " -march=native -### -x c++ -c -")
+        cpu_match = re.search(r'"-target-cpu" "([^"]+)"', output)
+    else:
+        # eg: "  -march=                     znver3"
+        return_code, output = run_command_and_capture_output(compiler_path + " -march=native -Q --help=target")
+        cpu_match = re.search(r"^\s*-march=\s+(\S+)\s*$", output, re.MULTILINE)
+
+    if return_code == 0 and cpu_match:
+        native_cpu_flags = "-march=" + cpu_match.group(1)
+    else:
+        print("could not detect the cpu, using -march=native")
+    return native_cpu_flags
+
+
+_toolchain_cache = None
+_toolchain_cache_lock = threading.RLock()
+
+def get_default_toolchain_cache_path():
+    return get_default_compile_cache_dir() + "/toolchain.json"
+
+
+def resolve_tool_path(tool_path: str) -> str:
+    """Get the full path of a tool such as "g++" or '"deps/mingw64/bin/g++"', or None if it can not be found"""
+    tool_path = tool_path.strip('"')
+    if os.path.isfile(tool_path):
+        return os.path.abspath(tool_path)
+    return shutil.which(tool_path)
+
+
+def get_cached_probe(key: str, tool_paths: List[str], probe, cache_file_path: str = None) -> dict:
+    """Get the result of probe() from the toolchain cache on disk, or run it and store the result
+
+    The result is reused until any of the tools are modified(eg when the compiler is updated)
+    """
+    global _toolchain_cache
+    cache_file_path = cache_file_path or get_default_toolchain_cache_path()
+    tool_stamps = dict()
+    for tool_path in tool_paths:
+        try:
+            tool_stamps[tool_path] = os.stat(tool_path).st_mtime_ns
+        except (FileNotFoundError, TypeError):
+            tool_stamps[str(tool_path)] = None
+
+    with _toolchain_cache_lock:
+        if _toolchain_cache is None or _toolchain_cache.get("__path__") != cache_file_path:
+            _toolchain_cache = {"__path__": cache_file_path}
+            try:
+                with open(cache_file_path, "r") as file:
+                    _toolchain_cache.update(json.load(file))
+            except (FileNotFoundError, json.JSONDecodeError):
+                pass
+
+        cached = _toolchain_cache.get(key)
+        if cached and cached.get("tool_stamps") == tool_stamps:
+            return cached["result"]
+
+        result = probe()
+        _toolchain_cache[key] = {"tool_stamps": tool_stamps, "result": result}
+        os.makedirs(path_traverse_up(cache_file_path, 0), exist_ok=True)
+        write_json_file(cache_file_path, dict([(k, v) for k, v in _toolchain_cache.items() if k != "__path__"]))
+        return result
+
+
+def probe_compiler(compiler_path: str, cache_file_path: str = None) -> dict:
+    """Get information about a compiler, such as its version and target. The result is cached on disk
+
+    Returns
+    -------
+        dict: found, path, version, version_output, target, sysroot and native_cpu_flags
+    """
+    resolved_path = resolve_tool_path(compiler_path)
+    tool_paths = [resolved_path]
+    if resolved_path and is_clang_compiler(compiler_path) and "emscripten" in resolved_path.replace("\\", "/"):
+        # em++ is a script, the actual compiler is clang from the same emsdk
+        upstream_directory = path_traverse_up(resolved_path, 1)
+        tool_paths += [upstream_directory + "/bin/clang", upstream_directory + "/bin/clang.exe", upstream_directory + "/emscripten/emscripten-version.txt"]
+
+    def probe():
+        info = {"found": resolved_path is not None, "path": resolved_path, "version": None, "version_output": "", 
+                "target": None, "sysroot": None, "native_cpu_flags": "-march=native"}
+        if resolved_path is None:
+            return info
+        return_code, output = run_command_and_capture_output(compiler_path + " --version")
+        if return_code != 0:
+            info["found"] = False
+            return info
+        info["version_output"] = output
+        info["version"] = output.strip().splitlines()[0] if len(output.strip()) > 0 else None
+        return_code, output = run_command_and_capture_output(compiler_path + " -dumpmachine")
+        info["target"] = output.strip() if return_code == 0 else None
+        return_code, output = run_command_and_capture_output(compiler_path + " -print-sysroot")
+        info["sysroot"] = output.strip() if return_code == 0 and len(output.strip()) > 0 else None
+        if not is_clang_compiler(compiler_path) or "emscripten" not in resolved_path.replace("\\", "/"):
+            info["native_cpu_flags"] = detect_native_cpu_flags(compiler_path)
+        return info
+
+    return get_cached_probe("compiler|" + compiler_path, tool_paths, probe, cache_file_path)
+
+
+def probe_toolchain(deps_dir: str = path_traverse_up(__file__, 0) + "/deps", browser: bool = False, cache_file_path: str = None) -> dict:
+    """Detect the compiler, its version, the emsdk location and which libraries(SDL2, SDL2_image, OpenGL) are available
+
+    Everything is detected once and saved to disk, until the compiler is modified, so calling this is fast
+
+    Returns
+    -------
+        dict: platform, compiler(see probe_compiler), emsdk_dir and libraries(name -> True if available)
+    """
+    platform_name = platform.system()
+    compiler_path = get_default_compiler_path(deps_dir=deps_dir, browser=browser)
+    compiler_info = probe_compiler(compiler_path, cache_file_path)
+
+    def probe():
+        toolchain = {"platform": platform_name, "compiler": compiler_info, "emsdk_dir": None, "libraries": dict()}
+        if os.path.isdir(deps_dir + "/emsdk"):
+            toolchain["emsdk_dir"] = deps_dir + "/emsdk"
+        elif os.environ.get("EMSDK"):
+            toolchain["emsdk_dir"] = os.environ["EMSDK"].replace("\\", "/")
+
+        if browser:
+            # SDL2 and SDL2_image are emscripten ports, and OpenGL is provided by webgl
+            toolchain["libraries"] = {"SDL2": compiler_info["found"], "SDL2_image": compiler_info["found"], "GL": compiler_info["found"]}
+        elif platform_name == "Windows":
+            toolchain["libraries"] = {
+                "SDL2": os.path.isdir(deps_dir + "/sdl_mingw/SDL2-2.30.7"),
+                "SDL2_image": os.path.isdir(deps_dir + "/sdl_mingw/SDL2_image-2.8.2"),
+                "GL": os.path.isdir(deps_dir + "/glew-2.2.0"),
+            }
+        elif compiler_info["found"]:
+            toolchain["libraries"] = {
+                "SDL2": can_compile_and_link(compiler_path, "SDL2/SDL.h", "-lSDL2"),
+                "SDL2_image": can_compile_and_link(compiler_path, "SDL2/SDL_image.h", "-lSDL2_image -lSDL2"),
+                "GL": can_compile_and_link(compiler_path, "GL/gl.h", "-lGL"),
+            }
+        return toolchain
+
+    key = "toolchain|" + platform_name + "|" + str(browser) + "|" + os.path.abspath(deps_dir)
+    return get_cached_probe(key, [compiler_info["path"], deps_dir + "/emsdk", deps_dir + "/sdl_mingw", "/usr/include/SDL2", "/usr/include/GL"], probe, cache_file_path)
+
+
+def probe_linkers(compiler_path: str, cache_file_path: str = None) -> dict:
+    """Check which of the faster linkers(mold, lld and gold) work with the compiler, by linking a small program. The result is cached on disk
+
+    Returns
+    -------
+        dict: linker name -> True if it can be used with -fuse-ld=<name>
+    """
+    linker_names = {"mold": "mold", "lld": "ld.lld", "gold": "ld.gold"}
+    linker_paths = [shutil.which(linker_executable) for linker_executable in linker_names.values()]
+
+    def probe():
+        linkers = dict()
+        for linker_name, linker_executable in linker_names.items():
+            linkers[linker_name] = shutil.which(linker_executable) is not None and can_compile_and_link(compiler_path, "cstdio", "-fuse-ld=" + linker_name)
+        return linkers
+
+    return get_cached_probe("linkers|" + compiler_path, [resolve_tool_path(compiler_path)] + linker_paths, probe, cache_file_path)
+
+
+def can_compile_and_link(compiler_path: str, header: str, library_flags: str) -> bool:
+    """Check if a program including the header can be linked with the libraries"""
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        source_path = temporary_dir + "/probe.cpp"
+        with open(source_path, "w") as file:
+            file.write("#include <" + header + ">\nint main(int argc, char** argv) { return 0; }\n")
+        return_code, _ = run_command_and_capture_output(compiler_path + ' "' + source_path + '" ' + library_flags + ' -o "' + temporary_dir + '/probe.out"')
+        return return_code == 0
+
+
+def require_toolchain(deps_dir: str = path_traverse_up(__file__, 0) + "/deps", browser: bool = False, libraries: List[str] = None) -> dict:
+    """Check that the compiler and the libraries are available, raises an exception listing what is missing
+
+    Parameters
+    ----------
+        libraries (List[str]): Libraries that need to be available, eg ["SDL2", "SDL2_image", "GL"] for include_opengl
+    """
+    toolchain = probe_toolchain(deps_dir=deps_dir, browser=browser)
+    missing = []
+    if not toolchain["compiler"]["found"]:
+        missing.append("compiler " + get_default_compiler_path(deps_dir=deps_dir, browser=browser) + " (see cpp_std.md for how to install it)")
+    for library in libraries or []:
+        if not toolchain["libraries"].get(library, False):
+            missing.append("library " + library)
+    if len(missing) > 0:
+        raise Exception("Missing from the toolchain: " + ", ".join(missing))
+    return toolchain
+
+
+def get_default_compile_cache_dir():
+    return os.path.expanduser("~").replace("\\", "/") + "/.cache/cpp_build"
+
+
+def get_compiler_identity(compiler_path: str) -> str:
+    """Get the version information of the compiler, different compiler versions may produce different object files"""
+    return compiler_path + "\n" + probe_compiler(compiler_path)["version_output"]
+
+
+def run_training_commands(executable_path: str, training_commands: List[str]) -> float:
+    """Run each training command, where {executable} is replaced with the path to the executable
+
+    Returns
+    -------
+        float: The total wall time of the commands in seconds, or None if any of them failed
+    """
+    total_time = 0.0
+    for training_command in training_commands:
+        command = training_command.replace("{executable}", '"' + executable_path + '"')
+        print(command)
+        result = run_command_and_measure(command, capture_output=False)
+        if result.return_code != 0:
+            print("training command failed: " + command)
+            return None
+        total_time += result.wall_time
+    return total_time
+
+
+def get_llvm_profdata_path(compiler_path: str) -> str:
+    """Find llvm-profdata, used to merge the profiles written by clang. Prefer the one next to the compiler, since the versions need to match"""
+    compiler_directory = os.path.dirname(compiler_path.strip('"'))
+    for file_name in ["llvm-profdata", "llvm-profdata.exe"]:
+        if len(compiler_directory) > 0 and os.path.exists(compiler_directory + "/" + file_name):
+            return '"' + compiler_directory + "/" + file_name + '"'
+    return "llvm-profdata"
+
+
+def benchmark_executable(executable_path: str, arguments: str = "", runs: int = 10, warmup_runs: int = 2, baseline_file_path: str = None, 
+                         save_baseline: bool = False, regression_threshold: float = 0.05) -> dict:
+    """Run an executable several times, and report the wall time, cpu time and peak memory usage
+
+    Parameters
+    ----------
+        executable_path (str): The executable to benchmark, it is run in its own directory
+        arguments (str): Command line arguments for the executable
+        runs (int): How many times to run it after the warmup runs
+        warmup_runs (int): Runs that are not measured, to warm up the disk cache etc.
+        baseline_file_path (str): A json file with a previous result, to compare against
+        save_baseline (bool): Save this result as the new baseline
+        regression_threshold (float): How much slower(or larger) than the baseline is considered a regression, 0.05 means 5%
+
+    Returns
+    -------
+        dict: The samples and statistics for each metric, and a list of regressions compared to the baseline
+    """
+    command = '"' + executable_path + '"' + (" " + arguments if len(arguments) > 0 else "")
+    command_arguments = [os.path.abspath(executable_path)] + shlex.split(arguments) # Run without a shell, so starting it is not measured
+    executable_directory = path_traverse_up(executable_path, 0)
+
+    print(f"benchmarking {command} ({warmup_runs} warmup runs, {runs} runs)")
+    samples = {"wall_time": [], "user_time": [], "system_time": [], "max_rss_kb": []}
+    for i in range(warmup_runs + runs):
+        result = run_command_and_measure(command_arguments, capture_output=True, cwd=executable_directory, measure_memory=True)
+        if result.return_code != 0:
+            print(result.output)
+            raise Exception("benchmark failed, " + command + " returned " + str(result.return_code))
+        if i < warmup_runs:
+            continue
+        samples["wall_time"].append(result.wall_time)
+        if result.user_time is not None:
+            samples["user_time"].append(result.user_time)
+            samples["system_time"].append(result.system_time)
+        if result.max_rss_kb is not None:
+            samples["max_rss_kb"].append(result.max_rss_kb)
+
+    report = {"command": command, "runs": runs, "metrics": dict(), "regressions": []}
+    for metric, metric_samples in samples.items():
+        if len(metric_samples) > 0:
+            report["metrics"][metric] = get_sample_statistics(metric_samples)
+
+    baseline = None
+    if baseline_file_path and os.path.exists(baseline_file_path):
+        with open(baseline_file_path, "r") as file:
+            baseline = json.load(file)
+
+    print(f"{'metric':<12} {'median':>12} {'p95':>12} {'95% ci of median':>27} {'baseline':>12} {'change':>8}")
+    for metric, statistics in report["metrics"].items():
+        line = f"{metric:<12} {statistics['median']:>12.4f} {statistics['p95']:>12.4f} {'[' + format(statistics['ci_low'], '.4f') + ', ' + format(statistics['ci_high'], '.4f') + ']':>27}"
+        baseline_statistics = baseline["metrics"].get(metric) if baseline else None
+        if baseline_statistics and baseline_statistics["median"] > 0:
+            change = statistics["median"] / baseline_statistics["median"] - 1
+            line += f" {baseline_statistics['median']:>12.4f} {change * 100:>+7.1f}%"
+
+            # Only a regression if it is beyond the threshold, and the confidence intervals do not overlap
+            if change > regression_threshold and statistics["ci_low"] > baseline_statistics["ci_high"]:
+                report["regressions"].append({"metric": metric, "median": statistics["median"], "baseline_median": baseline_statistics["median"], "change": change})
+                line += "  REGRESSION"
+        print(line)
+
+    if baseline and len(report["regressions"]) == 0:
+        print("no regressions compared to " + baseline_file_path)
+
+    if save_baseline and baseline_file_path:
+        os.makedirs(path_traverse_up(baseline_file_path, 0), exist_ok=True)
+        write_json_file(baseline_file_path, report)
+        print("saved baseline to " + baseline_file_path)
+    return report
+
+
+def get_sample_statistics(samples: List[float]) -> dict:
+    """Get the median, p95, mean and a 95% confidence interval for the median of the samples
+
+    The confidence interval uses the order statistics of the samples, so it does not assume the 
+    samples are normally distributed(timings usually have a long tail)
+    """
+    sorted_samples = sorted(samples)
+    sample_count = len(sorted_samples)
+
+    def percentile(p: float) -> float:
+        position = (sample_count - 1) * p
+        lower_index = math.floor(position)
+        upper_index = min(lower_index + 1, sample_count - 1)
+        return sorted_samples[lower_index] + (sorted_samples[upper_index] - sorted_samples[lower_index]) * (position - lower_index)
+
+    ci_offset = 1.96 * math.sqrt(sample_count) / 2
+    ci_low_index = max(int(math.floor(sample_count / 2 - ci_offset)), 0)
+    ci_high_index = min(int(math.ceil(sample_count / 2 + ci_offset)), sample_count - 1)
+
+    mean = sum(sorted_samples) / sample_count
+    variance = sum([(sample - mean) ** 2 for sample in sorted_samples]) / (sample_count - 1) if sample_count > 1 else 0.0
+    return {
+        "samples": samples,
+        "median": percentile(0.5),
+        "p95": percentile(0.95),
+        "mean": mean,
+        "stdev": math.sqrt(variance),
+        "min": sorted_samples[0],
+        "max": sorted_samples[-1],
+        "ci_low": sorted_samples[ci_low_index],
+        "ci_high": sorted_samples[ci_high_index],
+    }
+
+
+def profile_executable(executable_path: str, arguments: str = "", profile_tag: str = None, profiler: str = None, frequency: int = 999) -> str:
+    """Run an executable under a profiler, and write the collapsed stacks(<executable>.<tag>.collapsed) 
+    and a flame graph(<executable>.<tag>.svg) next to it
+
+    Parameters
+    ----------
+        executable_path (str): The executable to profile, preferably built with -g -fno-omit-frame-pointer
+        arguments (str): Command line arguments for the executable
+        profile_tag (str): Added to the output file names and the flame graph title, eg the build profile name
+        profiler (str): "perf" or "callgrind"(valgrind), defaults to perf if it is installed. 
+            Callgrind is much slower, and its stacks are estimated from the call graph
+        frequency (int): How many times per second perf samples the call stacks
+
+    Returns
+    -------
+        str: The path to the flame graph svg, or None if profiling failed
+    """
+    if profiler is None:
+        if shutil.which("perf"):
+            profiler = "perf"
+        elif shutil.which("valgrind"):
+            profiler = "callgrind"
+        else:
+            raise Exception("No profiler found, install perf(linux-tools) or valgrind")
+
+    executable_path = os.path.abspath(executable_path)
+    executable_directory = path_traverse_up(executable_path, 0)
+    output_prefix = executable_path + ("." + profile_tag if profile_tag else "")
+    command_arguments = (" " + arguments if len(arguments) > 0 else "")
+
+    if profiler == "perf":
+        perf_data_path = output_prefix + ".perf.data"
+        command = f'perf record -F {frequency} -g -o "{perf_data_path}" -- "{executable_path}"' + command_arguments
+        print(command)
+        if run_command_and_measure(command, capture_output=False, cwd=executable_directory).return_code != 0:
+            print("profiling failed, perf may need: sudo sysctl kernel.perf_event_paranoid=1")
+            return None
+        process = subprocess.run(["perf", "script", "-i", perf_data_path], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        stack_counts = collapse_perf_script(process.stdout.decode(errors="replace"))
+
+    elif profiler == "callgrind":
+        callgrind_output_path = output_prefix + ".callgrind.out"
+        command = f'valgrind --tool=callgrind --callgrind-out-file="{callgrind_output_path}" "{executable_path}"' + command_arguments
+        print(command)
+        if run_command_and_measure(command, capture_output=False, cwd=executable_directory).return_code != 0:
+            print("profiling failed")
+            return None
+        with open(callgrind_output_path, "r", errors="replace") as file:
+            stack_counts = collapse_callgrind_output(file.read())
 
-    def include_asio(self): # Asio is a cross platform networking library to work with sockets etc.
-        add_asio_flags(self, browser=self.browser_flag)
+    else:
+        raise Exception("Unknown profiler: " + str(profiler) + ", expected perf or callgrind")
 
-    def generate_build_command(self):
-        arguments = [
-            self.n1_compiler_path, 
-            self.n2_cpp_files,
-            self.n3_optimization_level,
-            self.n4_macros,
-            self.n5_additional_compiler_settings,
-            self.n6_include_paths,
-            self.n7_library_paths,
-            self.n8_library_files,
-            "-o " + '"' + self.n9_output_file + '"',
-        ]
+    if len(stack_counts) == 0:
+        print("no samples were recorded")
+        return None
 
-        # Reomve arguments with length 0
-        arguments = filter(lambda arg: len(arg) > 0, arguments)
+    with open(output_prefix + ".collapsed", "w") as file:
+        for stack, count in sorted(stack_counts.items()):
+            file.write(stack + " " + str(count) + "\n")
 
-        return " ".join(arguments)
+    title = "Flame graph: " + pathlib.Path(executable_path).name + " (" + ("profile: " + profile_tag + ", " if profile_tag else "") + profiler + ")"
+    write_flame_graph_svg(stack_counts, output_prefix + ".svg", title=title, count_name="samples" if profiler == "perf" else "instructions")
+    print("wrote flame graph " + output_prefix + ".svg")
+    return output_prefix + ".svg"
 
 
-    def build_and_run(self):
-        build_command = self.generate_build_command()
+def collapse_perf_script(perf_script_output: str) -> dict:
+    """Convert the output of perf script into collapsed stacks, eg {"run.out;main;update;draw": 12}"""
+    stack_counts = dict()
+    for sample in perf_script_output.split("\n\n"):
+        lines = [line for line in sample.split("\n") if len(line.strip()) > 0]
+        if len(lines) == 0:
+            continue
 
-        # Remove the output file if it exists already
-        if os.path.exists(self.n9_output_file):
-            os.remove(self.n9_output_file)
+        # The first line is the header, eg "run.out  1234 12345.678: 1010101 cpu-clock:", then one line per frame with the leaf first
+        frames = [lines[0].split()[0]]
+        for line in reversed(lines[1:]):
+            parts = line.strip().split(" ", 1)
+            symbol = parts[1].rsplit(" (", 1)[0] if len(parts) > 1 else "[unknown]"
+            frames.append(re.sub(r"\+0x[0-9a-f]+$", "", symbol).replace(";", ":"))
+        stack = ";".join(frames)
+        stack_counts[stack] = stack_counts.get(stack, 0) + 1
+    return stack_counts
 
-        # Run the build command
-        print(build_command)
-        run_command(build_command)
 
-        invoke_file(self.n9_output_file)
+def collapse_callgrind_output(callgrind_output: str, min_cost_fraction: float = 0.0001) -> dict:
+    """Estimate collapsed stacks from callgrind output
 
+    Callgrind only records the cost of each function and of each call, not whole stacks. The cost of a function 
+    is split between its callers in proportion to how much of its cost came from each of them
+    """
+    compressed_names = dict()
+    self_costs = dict()
+    call_costs = dict() # caller -> callee -> inclusive cost of the calls
+    function_name = None
+    called_function_name = None
+    expect_call_cost = False
 
-def get_default_output_file(browser = False):
-    platform_name = platform.system()
+    def get_name(value: str) -> str:
+        # Names are compressed, eg "(12) main" the first time and "(12)" after that. fn and cfn share the same ids
+        match = re.match(r"\((\d+)\)\s*(.*)", value)
+        if not match:
+            return value
+        if match.group(2):
+            compressed_names[match.group(1)] = match.group(2)
+        return compressed_names.get(match.group(1), value)
 
-    if not browser:
-        if platform_name == "Windows": # Windows
-            return "run.exe"
+    for line in callgrind_output.split("\n"):
+        if line.startswith("fn="):
+            function_name = get_name(line[3:])
+            self_costs.setdefault(function_name, 0)
+        elif line.startswith("cfn="):
+            called_function_name = get_name(line[4:])
+        elif line.startswith("calls="):
+            expect_call_cost = True
+        elif len(line) > 0 and (line[0].isdigit() or line[0] in "+-*") and function_name is not None:
+            parts = line.split()
+            cost = int(parts[1]) if len(parts) > 1 else 0
+            if expect_call_cost:
+                callees = call_costs.setdefault(function_name, dict())
+                callees[called_function_name] = callees.get(called_function_name, 0) + cost
+                expect_call_cost = False
+            else:
+                self_costs[function_name] += cost
+
+    called_costs = dict()
+    for callees in call_costs.values():
+        for callee, cost in callees.items():
+            called_costs[callee] = called_costs.get(callee, 0) + cost
+    inclusive_costs = {function_name: self_costs.get(function_name, 0) + sum(call_costs.get(function_name, dict()).values())
+                       for function_name in set(self_costs) | set(called_costs)}
+    min_cost = sum(self_costs.values()) * min_cost_fraction
+
+    stack_counts = dict()
+    def add_stacks(stack: List[str], function_name: str, cost: float):
+        scale = cost / inclusive_costs[function_name] if inclusive_costs[function_name] > 0 else 0
+        stack = stack + [function_name.replace(";", ":")]
+        self_cost = int(self_costs.get(function_name, 0) * scale)
+        if self_cost > 0:
+            stack_counts[";".join(stack)] = stack_counts.get(";".join(stack), 0) + self_cost
+        for callee, call_cost in call_costs.get(function_name, dict()).items():
+            # Recursion is cut off at the first repeat, since its cost is already included in the outer call
+            if call_cost * scale >= min_cost and callee.replace(";", ":") not in stack:
+                add_stacks(stack, callee, call_cost * scale)
+
+    root_function_names = [function_name for function_name in inclusive_costs if function_name not in called_costs]
+    for function_name in root_function_names:
+        add_stacks([], function_name, inclusive_costs[function_name])
+    return stack_counts
+
+
+def write_flame_graph_svg(stack_counts: dict, file_path: str, title: str = "Flame graph", count_name: str = "samples", width: int = 1200):
+    """Write a flame graph svg from collapsed stacks, where the width of each frame is how often it was on the stack.
+    Hover a frame to see its full name and count
+    """
+    from xml.sax.saxutils import escape
+
+    # Build a tree of the frames, so frames with the same parents are merged
+    root = {"name": "all", "count": 0, "children": dict()}
+    for stack, count in stack_counts.items():
+        node = root
+        node["count"] += count
+        for frame in stack.split(";"):
+            node = node["children"].setdefault(frame, {"name": frame, "count": 0, "children": dict()})
+            node["count"] += count
+
+    frame_height = 16
+    padding = 10
+    title_height = 30
+    min_width = 0.1
+    total_count = max(root["count"], 1)
+    x_scale = (width - 2 * padding) / total_count
+
+    rectangles = []
+    max_depth = 0
+    def add_frames(node: dict, x: float, depth: int):
+        nonlocal max_depth
+        max_depth = max(max_depth, depth)
+        rectangles.append((node, x, depth))
+        child_x = x
+        for child in sorted(node["children"].values(), key=lambda child: child["name"]):
+            if child["count"] * x_scale >= min_width:
+                add_frames(child, child_x, depth + 1)
+            child_x += child["count"] * x_scale
+    add_frames(root, padding, 0)
+
+    height = title_height + (max_depth + 1) * frame_height + padding
+    lines = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}" font-family="Verdana, sans-serif" font-size="12">',
+        f'<rect x="0" y="0" width="{width}" height="{height}" fill="#f8f8f8"/>',
+        f'<text x="{width / 2}" y="20" text-anchor="middle" font-size="16">{escape(title)}</text>',
+    ]
+    for node, x, depth in rectangles:
+        frame_width = node["count"] * x_scale
+        y = height - padding - (depth + 1) * frame_height # The root is at the bottom
+        name_hash = int(hashlib.md5(node["name"].encode()).hexdigest()[:6], 16)
+        color = f"rgb({205 + name_hash % 50},{(name_hash >> 8) % 180},{(name_hash >> 16) % 55})"
+        tooltip = f'{node["name"]} ({node["count"]} {count_name}, {100 * node["count"] / total_count:.2f}%)'
+        label = node["name"]
+        max_characters = int((frame_width - 6) / 7)
+        if len(label) > max_characters:
+            label = label[:max_characters - 2] + ".." if max_characters > 2 else ""
+        lines.append(f'<g><title>{escape(tooltip)}</title><rect x="{x:.2f}" y="{y}" width="{frame_width:.2f}" height="{frame_height - 1}" fill="{color}" rx="2"/>'
+                     + (f'<text x="{x + 3:.2f}" y="{y + frame_height - 4}">{escape(label)}</text>' if len(label) > 0 else "") + '</g>')
+    lines.append("</svg>")
+
+    with open(file_path, "w") as file:
+        file.write("\n".join(lines) + "\n")
+
+
+def parse_preprocessed_includes(preprocessed_output: str) -> dict:
+    """Find the headers in the output of the preprocessor(-E), using the line markers, eg '# 1 "/usr/include/c++/13/regex" 1 3'
+
+    Returns
+    -------
+        dict: size(bytes of preprocessed output) and headers(path -> size including the headers it included, 
+            if it is a system header, and the files that included it directly)
+    """
+    headers = dict()
+    stack = [] # [file path, size including nested headers]
+    line_marker_pattern = re.compile(r'^# \d+ "(.*)"((?: \d)*)$')
+
+    def pop_file():
+        file_path, size = stack.pop()
+        if stack:
+            stack[-1][1] += size
+        if file_path in headers:
+            headers[file_path]["size"] += size
+
+    total_size = 0
+    for line in preprocessed_output.split("\n"):
+        match = line_marker_pattern.match(line) if line.startswith("# ") else None
+        if not match:
+            if stack:
+                stack[-1][1] += len(line) + 1
+            total_size += len(line) + 1
+            continue
+
+        file_path = match.group(1)
+        flags = match.group(2).split()
+        if "1" in flags and stack:
+            # Entering an included file
+            if not file_path.startswith("<"):
+                header = headers.setdefault(file_path, {"size": 0, "system": "3" in flags, "includers": set()})
+                header["includers"].add(stack[-1][0])
+            stack.append([file_path, 0])
+        elif "2" in flags:
+            # Returning to the file that included the current one
+            while len(stack) > 1 and stack[-1][0] != file_path:
+                pop_file()
+        elif not stack:
+            stack.append([file_path, 0])
+        elif stack[-1][0] != file_path and len(stack) == 1:
+            # Switching between the main file and <built-in>/<command-line> at the start
+            stack[-1][0] = file_path
+
+    while stack:
+        pop_file()
+    return {"size": total_size, "headers": headers}
+
+
+def get_include_report(translation_units: List[dict], precompiled_header_paths: List[str] = None, min_cost_fraction: float = 0.05) -> dict:
+    """Combine the includes of each translation unit(see parse_preprocessed_includes), and estimate the parse time of each header"""
+    translation_unit_paths = set([translation_unit["file"] for translation_unit in translation_units])
+    precompiled_header_paths = set([os.path.abspath(header_path) for header_path in precompiled_header_paths or []])
+    total_parse_time = sum([translation_unit["parse_time"] for translation_unit in translation_units])
+
+    headers = dict()
+    for translation_unit in translation_units:
+        for header_path, header in translation_unit["headers"].items():
+            statistics = headers.setdefault(header_path, {"translation_unit_count": 0, "total_size": 0, "parse_time": 0.0, "system": header["system"], "includers": set()})
+            statistics["translation_unit_count"] += 1
+            statistics["total_size"] += header["size"]
+            if translation_unit["size"] > 0:
+                statistics["parse_time"] += translation_unit["parse_time"] * header["size"] / translation_unit["size"]
+            statistics["includers"].update(header["includers"])
+
+    recommendations = []
+    common_count = max(2, len(translation_units) / 2)
+    for header_path, statistics in sorted(headers.items(), key=lambda item: item[1]["parse_time"], reverse=True):
+        if total_parse_time == 0 or statistics["parse_time"] < total_parse_time * min_cost_fraction:
+            break
+        header_name = get_header_display_name(header_path, statistics["system"])
+        project_includers = [includer for includer in statistics["includers"] if includer not in translation_unit_paths and not headers.get(includer, {}).get("system", True)]
+        included_by_cpp_file = len(statistics["includers"] & translation_unit_paths) > 0
+
+        if statistics["system"] and len(project_includers) > 0:
+            # An expensive standard/library header pulled in through one of our own headers
+            includer_names = ", ".join(sorted([pathlib.Path(includer).name for includer in project_includers]))
+            recommendations.append(f"{header_name} is included by {includer_names} and costs {statistics['parse_time']:.2f}s, "
+                                   f"consider including it only in the cpp files that use it")
+        # Only the headers the cpp files include directly, the ones they include are part of the same precompiled header
+        if statistics["translation_unit_count"] >= common_count and included_by_cpp_file and os.path.abspath(header_path) not in precompiled_header_paths:
+            recommendations.append(f"{header_name} is included in {statistics['translation_unit_count']}/{len(translation_units)} files "
+                                   f"and costs {statistics['parse_time']:.2f}s, consider adding it to the precompiled header")
+
+    for statistics in headers.values():
+        statistics["includers"] = sorted(statistics["includers"])
+    return {
+        "total_parse_time": total_parse_time,
+        "translation_units": [{"file": translation_unit["file"], "size": translation_unit["size"], "parse_time": translation_unit["parse_time"]} 
+                              for translation_unit in translation_units],
+        "headers": headers,
+        "recommendations": recommendations,
+    }
+
+
+def get_header_display_name(header_path: str, system: bool) -> str:
+    """eg <c++/13/regex> for system headers, and the path for our own headers"""
+    if system and "/include/" in header_path.replace("\\", "/"):
+        return "<" + header_path.replace("\\", "/").rsplit("/include/", 1)[1] + ">"
+    return header_path
+
+
+def print_include_report(report: dict, report_count: int = 20):
+    total_parse_time = report["total_parse_time"]
+    print(f"{'header':<60} {'files':>6} {'avg size kb':>12} {'parse time':>11} {'share':>7}")
+    for header_path, statistics in sorted(report["headers"].items(), key=lambda item: item[1]["parse_time"], reverse=True)[:report_count]:
+        header_name = get_header_display_name(header_path, statistics["system"])
+        if len(header_name) > 60:
+            header_name = "..." + header_name[-57:]
+        average_size = statistics["total_size"] / statistics["translation_unit_count"] / 1024
+        share = 100 * statistics["parse_time"] / total_parse_time if total_parse_time > 0 else 0
+        print(f"{header_name:<60} {statistics['translation_unit_count']:>6} {average_size:>12.1f} {statistics['parse_time']:>10.2f}s {share:>6.1f}%")
+    print(f"total parse time {total_parse_time:.2f}s for {len(report['translation_units'])} files")
+
+    for recommendation in report["recommendations"]:
+        print("- " + recommendation)
+
+
+def run_command_and_capture_output(command: str):
+    """Run a command in the terminal without printing anything, 
+    returns the exit status of the command and what it printed(stdout and stderr combined)"""
+    result = run_command_and_measure(command)
+    return result.return_code, result.output
+
+
+class CommandResult:
+    """The exit status, output and resource usage of a command"""
+    def __init__(self):
+        self.return_code = 0
+        self.output = ""
+        self.start_time = time.perf_counter()
+        self.wall_time = 0.0
+        self.user_time = None # Cpu time in seconds, not available on windows
+        self.system_time = None
+        self.max_rss_kb = None # Peak memory usage of the largest process, only measured when asked for
 
-        elif platform_name == "Linux": # Linux
-            return "run.out"
 
+# Linux carries the peak memory usage of a process over through fork and exec, so a command started from this(possibly large)
+# python process would report the memory usage of this process. Instead this small script starts the command and measures it
+MEASURE_COMMAND_SCRIPT = """
+import os, sys, time
+start_time = time.perf_counter()
+pid = os.fork()
+if pid == 0:
+    try:
+        os.execvp(sys.argv[2], sys.argv[2:])
+    except OSError as e:
+        sys.stderr.write(sys.argv[2] + ": " + str(e) + "\\n")
+    os._exit(127)
+_, status, usage = os.wait4(pid, 0)
+wall_time = time.perf_counter() - start_time
+with open(sys.argv[1], "w") as file:
+    file.write(f"{os.waitstatus_to_exitcode(status)} {wall_time} {usage.ru_utime} {usage.ru_stime} {usage.ru_maxrss}")
+"""
+
+
+def get_gnu_time_path() -> str:
+    """Get the path of GNU time, or None if it is not installed(eg on mac, where /usr/bin/time is the bsd version)"""
+    time_path = shutil.which("time")
+    if time_path is None:
+        return None
+
+    def probe():
+        try:
+            process = subprocess.run([time_path, "-f", "%M", "true"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            return {"gnu": False}
+        return {"gnu": process.returncode == 0 and process.stderr.strip().isdigit()}
+    return time_path if get_cached_probe("gnu_time", [time_path], probe)["gnu"] else None
+
+
+def run_command_and_measure(command, capture_output: bool = True, cwd: str = None, measure_memory: bool = False) -> CommandResult:
+    """Run a command in the terminal and measure how long it took, and how much cpu time it used
+    
+    Parameters
+    ----------
+        command (str or List[str]): The command to run, a list of arguments is run directly instead of using the shell
+        capture_output (bool): Capture what the command printed(stdout and stderr combined) instead of printing it
+        cwd (str): The directory to run the command in, defaults to the current directory
+        measure_memory (bool): Also measure the peak memory usage, by starting the command from GNU time or a small python process.
+            Not available on windows
+    """
+    result = CommandResult()
+    arguments = [command] if isinstance(command, str) else list(command)
+
+    stats_file_path = None
+    gnu_time_path = None
+    if measure_memory and hasattr(os, "wait4"):
+        file_descriptor, stats_file_path = tempfile.mkstemp(suffix=".stats")
+        os.close(file_descriptor)
+        command_arguments = ["/bin/sh", "-c", command] if isinstance(command, str) else list(command)
+        gnu_time_path = get_gnu_time_path()
+        if gnu_time_path:
+            arguments = [gnu_time_path, "-f", "%M", "-o", stats_file_path] + command_arguments
         else:
-            raise NotImplementedError()
-        
+            arguments = [sys.executable, "-I", "-S", "-c", MEASURE_COMMAND_SCRIPT, stats_file_path] + command_arguments
+
+    # Write the output to a temporary file instead of a pipe, so the process can be waited on directly
+    output_file = tempfile.TemporaryFile() if capture_output else None
+    shell = isinstance(command, str) and stats_file_path is None
+    process = subprocess.Popen(arguments[0] if shell else arguments, shell=shell, stdout=output_file, stderr=subprocess.STDOUT if capture_output else None, cwd=cwd)
+
+    if hasattr(os, "wait4"):
+        # wait4 also reports the cpu time of the process(including the processes it waited for, such as cc1plus).
+        # Its ru_maxrss is not used, since it includes the memory usage of this process, see MEASURE_COMMAND_SCRIPT
+        _, status, resource_usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        result.user_time = resource_usage.ru_utime
+        result.system_time = resource_usage.ru_stime
     else:
-        return "run.html"
+        process.wait()
 
+    result.wall_time = time.perf_counter() - result.start_time
+    result.return_code = process.returncode
 
-def run_command(command: str) -> None:
-    """Run a command in the terminal"""
-    platform_name = platform.system()
-    if platform_name == "Windows": # Windows
-        if command[0] != '"':
-            os.system(f'powershell; {command}')
+    if stats_file_path:
+        with open(stats_file_path, "r") as file:
+            stats = file.read().split()
+        os.remove(stats_file_path)
+        if gnu_time_path and len(stats) > 0:
+            # GNU time writes "Command exited with non-zero status ..." before the stats when the command fails
+            result.max_rss_kb = int(stats[-1])
+        elif len(stats) == 5:
+            # The time it took python to start is not included in the times measured by the script
+            result.return_code = int(stats[0])
+            result.wall_time, result.user_time, result.system_time = float(stats[1]), float(stats[2]), float(stats[3])
+            result.max_rss_kb = int(stats[4]) if platform.system() != "Darwin" else int(stats[4]) // 1024
+
+    if output_file:
+        output_file.seek(0)
+        result.output = output_file.read().decode(errors="replace")
+        output_file.close()
+    return result
+
+
+class BuildTimer:
+    """Records how long each part of the build takes, and writes it as a chrome trace and a text summary"""
+    def __init__(self, trace_file_path: str):
+        self.trace_file_path = trace_file_path
+        self.compiler_time_report = True
+        self.events = []
+        self.saved_event_count = 0 # Nothing is written when there are no new events, eg when the build was already up to date
+        self._start_time = time.perf_counter()
+        self._thread_ids = dict()
+        self._lock = threading.Lock()
+
+    def add_event(self, name: str, category: str, start_time: float, wall_time: float, cpu_time: float = None, args: dict = None):
+        """Add an event, start_time is from time.perf_counter()"""
+        with self._lock:
+            # Show each thread as its own row in the trace
+            thread_id = self._thread_ids.setdefault(threading.get_ident(), len(self._thread_ids) + 1)
+            self.events.append({
+                "name": name,
+                "category": category,
+                "start_time": start_time - self._start_time,
+                "wall_time": wall_time,
+                "cpu_time": cpu_time,
+                "thread_id": thread_id,
+                "args": args or dict(),
+            })
+
+    def add_command_result(self, name: str, category: str, result: CommandResult, args: dict = None):
+        args = dict(args or dict())
+        cpu_time = None
+        if result.user_time is not None:
+            cpu_time = result.user_time + result.system_time
+            args["user_time"] = result.user_time
+            args["system_time"] = result.system_time
+        if result.max_rss_kb is not None:
+            args["max_rss_kb"] = result.max_rss_kb
+        self.add_event(name, category, result.start_time, result.wall_time, cpu_time, args)
+
+    def add_compile_result(self, compile_job: CompileJob, result: CommandResult) -> str:
+        """Add the time it took to compile a file, including the compiler frontend/backend times if they were reported
+
+        Returns
+        -------
+            str: The compiler output, without the time report
+        """
+        args = {"file": compile_job.cpp_file_path, "cache_hit": compile_job.cache_hit}
+        output = result.output
+        phase_times = dict()
+        if "-ftime-report" in compile_job.time_report_flags:
+            phase_times, output = parse_gcc_time_report(output)
+        elif "-ftime-trace" in compile_job.time_report_flags:
+            phase_times = read_clang_time_trace(compile_job.object_file_path[:-2] + ".json")
+        args.update(phase_times)
+
+        name = pathlib.Path(compile_job.cpp_file_path).name
+        self.add_command_result(name, "compile", result, args)
+
+        # Show the frontend and backend as parts of the compile event
+        phase_start_time = result.start_time
+        for phase in ["frontend", "backend"]:
+            if phase in phase_times:
+                self.add_event(phase, "compile phase", phase_start_time, phase_times[phase], args={"file": compile_job.cpp_file_path})
+                phase_start_time += phase_times[phase]
+        return output
+
+    def has_unsaved_events(self) -> bool:
+        with self._lock:
+            return len(self.events) > self.saved_event_count
+
+    def save(self, print_summary: bool = True):
+        with self._lock:
+            self.saved_event_count = len(self.events)
+        self.write_chrome_trace(self.trace_file_path)
+        summary = self.get_summary()
+        summary_file_path = path_traverse_up(self.trace_file_path, 0) + "/build_summary.txt"
+        with open(summary_file_path, "w") as file:
+            file.write(summary)
+        if print_summary:
+            print("\n".join(summary.splitlines()[:15]))
+            print("build trace written to " + self.trace_file_path)
+
+    def write_chrome_trace(self, trace_file_path: str):
+        """Write the events in the chrome trace event format"""
+        trace_events = []
+        with self._lock:
+            for event in self.events:
+                args = dict(event["args"])
+                if event["cpu_time"] is not None:
+                    args["cpu_time"] = event["cpu_time"]
+                trace_events.append({
+                    "name": event["name"],
+                    "cat": event["category"],
+                    "ph": "X", # A complete event, with a start time and a duration
+                    "ts": event["start_time"] * 1000000, # In microseconds
+                    "dur": event["wall_time"] * 1000000,
+                    "pid": 1,
+                    "tid": event["thread_id"],
+                    "args": args,
+                })
+
+        os.makedirs(path_traverse_up(trace_file_path, 0), exist_ok=True)
+        with open(trace_file_path, "w") as file:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, file)
+
+    def get_summary(self) -> str:
+        """Get the time spent in each category, and each event sorted with the slowest first"""
+        with self._lock:
+            events = [event for event in self.events if event["category"] != "compile phase"]
+
+        lines = []
+        categories = []
+        for event in events:
+            if event["category"] not in categories:
+                categories.append(event["category"])
+        for category in categories:
+            category_events = [event for event in events if event["category"] == category]
+            wall_time = sum([event["wall_time"] for event in category_events])
+            cpu_time = sum([event["cpu_time"] or 0 for event in category_events])
+            lines.append(f"{category}: {wall_time:.2f}s wall, {cpu_time:.2f}s cpu ({len(category_events)} events)")
+
+        lines.append("")
+        lines.append(f"{'wall(s)':>9} {'cpu(s)':>9} {'frontend':>9} {'backend':>9}  name")
+        for event in sorted(events, key=lambda event: -event["wall_time"]):
+            cpu_time = f"{event['cpu_time']:.2f}" if event["cpu_time"] is not None else "-"
+            frontend_time = f"{event['args']['frontend']:.2f}" if "frontend" in event["args"] else "-"
+            backend_time = f"{event['args']['backend']:.2f}" if "backend" in event["args"] else "-"
+            name = event["args"].get("file", event["name"])
+            if event["args"].get("cache_hit"):
+                name += " (compile cache hit)"
+            lines.append(f"{event['wall_time']:>9.2f} {cpu_time:>9} {frontend_time:>9} {backend_time:>9}  {event['category']}: {name}")
+        return "\n".join(lines) + "\n"
+
+
+def parse_gcc_time_report(output: str):
+    """Get the time spent in the frontend and backend from the output of g++ -ftime-report
+
+    Returns
+    -------
+        (dict, str): The wall time of the frontend and backend in seconds, and the output without the time report
+    """
+    phase_times = dict()
+    remaining_lines = []
+    in_time_report = False
+    for line in output.splitlines():
+        if line.startswith("Time variable"):
+            in_time_report = True
+            continue
+        if in_time_report:
+            # eg " phase parsing   :   1.07 ( 93%)   0.53 ( 96%)   1.68 ( 94%)    84M ( 93%)", the third time is the wall time
+            phase_match = re.match(r"\s*phase ([^:]+?)\s*:\s*[\d.]+\s*\(\s*\d+%\)\s*[\d.]+\s*\(\s*\d+%\)\s*([\d.]+)", line)
+            if phase_match:
+                phase_name = phase_match.group(1)
+                phase = "frontend" if phase_name in ["setup", "parsing", "lang. deferred"] else "backend"
+                phase_times[phase] = phase_times.get(phase, 0.0) + float(phase_match.group(2))
+            if line.strip().startswith("TOTAL"):
+                in_time_report = False
+            continue
+        if line.startswith("Extra diagnostic checks enabled") or line.startswith("Configure with --enable-checking"):
+            continue
+        remaining_lines.append(line)
+    return phase_times, "\n".join(remaining_lines).strip()
+
+
+def read_clang_time_trace(time_trace_path: str) -> dict:
+    """Get the time spent in the frontend and backend from the json file written by clang -ftime-trace"""
+    phase_times = dict()
+    try:
+        with open(time_trace_path, "r") as file:
+            trace = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return phase_times
+
+    for event in trace.get("traceEvents", []):
+        if event.get("name") == "Total Frontend":
+            phase_times["frontend"] = event["dur"] / 1000000
+        elif event.get("name") == "Total Backend":
+            phase_times["backend"] = event["dur"] / 1000000
+    return phase_times
+
+
+def parse_dependency_file(dependency_file_path: str) -> List[str]:
+    """Read the prerequisites from a make style dependency file, as written by the compiler using -MMD -MF
+
+    Returns
+    -------
+        List[str]: The paths of the files the target depends on, eg the cpp file and all headers it included
+    """
+    with open(dependency_file_path, "r") as file:
+        contents = file.read().replace("\\\r\n", " ").replace("\\\n", " ")
+
+    # The target ends at the first colon followed by whitespace(windows paths such as C:/ contain colons)
+    separator = re.search(r":(\s|$)", contents)
+    if separator is None:
+        return []
+    prerequisites = contents[separator.end():]
+
+    # Split on whitespace that is not escaped, "\ " is a space inside a file name
+    paths = []
+    for token in re.split(r"(?<!\\)\s+", prerequisites.strip()):
+        if len(token) > 0:
+            paths.append(token.replace("\\ ", " ").replace("\\#", "#").replace("$$", "$"))
+    return paths
+
+
+def write_command_file(command_file_path: str, command: str):
+    with open(command_file_path, "w") as file:
+        file.write(command)
+
+
+def is_up_to_date(target_path: str, input_paths: List[str], command_file_path: str, command: str, dependency_file_path: str = None) -> bool:
+    """Check if a target needs to be rebuilt
+
+    The target is up to date if it exists, was built using the same command as last time,
+    and none of the inputs(or the dependencies listed in the dependency file) are newer than it
+    """
+    if not os.path.exists(target_path) or not os.path.exists(command_file_path):
+        return False
+
+    with open(command_file_path, "r") as file:
+        if file.read() != command:
+            return False # The flags changed since last time
+
+    input_paths = list(input_paths)
+    if dependency_file_path:
+        if not os.path.exists(dependency_file_path):
+            return False
+        input_paths += parse_dependency_file(dependency_file_path)
+
+    target_modified_time = os.path.getmtime(target_path)
+    for input_path in input_paths:
+        if not os.path.exists(input_path):
+            return False # A header has been removed or renamed
+        if os.path.getmtime(input_path) > target_modified_time:
+            return False
+
+    return True
+
+
+class FileWatcher:
+    """Wait for files to change, using inotify on linux and checking the modification times on other platforms"""
+    def __init__(self, file_paths: List[str], poll_interval: float = 0.5):
+        self.poll_interval = poll_interval
+        self.file_paths = []
+        self._modified_times = dict()
+        self._inotify = None
+        self._watched_directories = dict() # directory -> inotify watch descriptor
+
+        if platform.system() == "Linux":
+            try:
+                self._inotify = Inotify()
+            except OSError as e:
+                print("inotify not available, checking for changes every " + str(poll_interval) + "s: " + str(e))
+
+        self.set_file_paths(file_paths)
+
+    def set_file_paths(self, file_paths: List[str]):
+        self.file_paths = [os.path.abspath(file_path) for file_path in file_paths]
+        # Keep the modified times of the files that were already watched, rather than reading them again,
+        # so that a file changed after the last check(eg while building) is still reported as changed
+        self._modified_times = dict([(file_path, self._modified_times[file_path] if file_path in self._modified_times else get_modified_time(file_path))
+                                     for file_path in self.file_paths])
+        if self._inotify:
+            # Watch the directories rather than the files, since many editors save by replacing the file
+            for directory in set([os.path.dirname(file_path) for file_path in self.file_paths]):
+                if directory not in self._watched_directories:
+                    self._watched_directories[directory] = self._inotify.add_watch(directory)
+
+    def wait_for_changes(self, debounce_seconds: float = 0.2) -> List[str]:
+        """Block until any of the files change
+
+        Returns
+        -------
+            List[str]: The files that changed, including any that changed within debounce_seconds of each other
+        """
+        changed_file_paths = set()
+        while len(changed_file_paths) == 0:
+            changed_file_paths.update(self._get_changed_file_paths(timeout=None))
+
+        # Wait for the burst of changes to end, eg when saving all files in the editor
+        while True:
+            more_changed_file_paths = self._get_changed_file_paths(timeout=debounce_seconds)
+            if len(more_changed_file_paths) == 0:
+                break
+            changed_file_paths.update(more_changed_file_paths)
+        return sorted(changed_file_paths)
+
+    def _get_changed_file_paths(self, timeout: float = None) -> List[str]:
+        if self._inotify:
+            watched_file_paths = set(self.file_paths)
+            changed_file_paths = [file_path for file_path in self._inotify.read_events(timeout) if file_path in watched_file_paths]
         else:
-            os.system(f'powershell; &{command}')
-    else:
-        os.system(command)
+            changed_file_paths = []
+            end_time = None if timeout is None else time.time() + timeout
+            while True:
+                for file_path in self.file_paths:
+                    modified_time = get_modified_time(file_path)
+                    if modified_time != self._modified_times[file_path]:
+                        changed_file_paths.append(file_path)
+                if len(changed_file_paths) > 0 or (end_time is not None and time.time() >= end_time):
+                    break
+                time.sleep(self.poll_interval if end_time is None else min(self.poll_interval, max(end_time - time.time(), 0)))
+
+        for file_path in changed_file_paths:
+            self._modified_times[file_path] = get_modified_time(file_path)
+        return changed_file_paths
+
+    def close(self):
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+
+
+class Inotify:
+    """Minimal wrapper around the linux inotify api, to get notified when files in a directory change.
+    Also used by LogTailer in python_setup.py"""
+    IN_MODIFY = 0x2
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    DEFAULT_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT_HEADER = struct.Struct("iIII") # watch descriptor, mask, cookie, name length
+
+    def __init__(self):
+        import ctypes, ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._directories = dict() # watch descriptor -> directory
+
+    def add_watch(self, directory: str, mask: int = DEFAULT_MASK) -> int:
+        import ctypes
+        watch_descriptor = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), mask)
+        if watch_descriptor < 0:
+            print("failed to watch " + directory + ": " + os.strerror(ctypes.get_errno()))
+        else:
+            self._directories[watch_descriptor] = directory
+        return watch_descriptor
 
+    def fileno(self) -> int:
+        """So that it can be waited on together with other files using select"""
+        return self._fd
 
-def invoke_file(file_path: str):
-    if not os.path.exists(file_path=file_path):
+    def read_events(self, timeout: float = None) -> List[str]:
+        """Wait for events, returns the paths of the files that changed. A timeout of 0 only reads the pending events"""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if len(readable) == 0:
+            return []
+
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return []
+
+        file_paths = []
+        offset = 0
+        while offset + self.EVENT_HEADER.size <= len(data):
+            watch_descriptor, _, _, name_length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = data[offset:offset + name_length].rstrip(b"\0")
+            offset += name_length
+            if watch_descriptor in self._directories and len(name) > 0:
+                file_paths.append(os.path.join(self._directories[watch_descriptor], os.fsdecode(name)))
+        return file_paths
+
+    def close(self):
+        os.close(self._fd)
+
+
+def get_modified_time(file_path: str):
+    try:
+        file_stat = os.stat(file_path)
+        return (file_stat.st_mtime_ns, file_stat.st_size)
+    except FileNotFoundError:
+        return None
+
+
+class RunningProgram:
+    """Keep a built program running in the background, so that it can be restarted after each rebuild"""
+    def __init__(self, file_path: str, cross_origin_isolated: bool = False):
+        self.file_path = file_path
+        self.cross_origin_isolated = cross_origin_isolated
+        self.process: subprocess.Popen = None
+        self.html_server: StaticFileServer = None
+
+    def restart(self):
+        if self.file_path.endswith(".html"):
+            # Open the page once, after that the open page reloads itself when the server says so
+            if not self.html_server:
+                self.html_server = launch_html_page(self.file_path, live_reload=True, cross_origin_isolated=self.cross_origin_isolated)
+            else:
+                self.html_server.notify_reload()
+            return
+
+        self.stop_process()
+        print("starting " + self.file_path)
+        self.process = subprocess.Popen([self.file_path], cwd=path_traverse_up(self.file_path, 0))
+
+    def stop_process(self):
+        if self.process and self.process.poll() is None:
+            print("stopping " + self.file_path)
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+
+    def stop(self):
+        self.stop_process()
+        if self.html_server:
+            self.html_server.stop()
+            self.html_server = None
+
+
+def invoke_file(file_path: str, cross_origin_isolated: bool = False, profile: bool = False):
+    if not os.path.exists(file_path):
         print(file_path + " does not exist")
 
     file_extension = file_path.split(".")[-1]
 
     if file_extension == "html":
-        # Create a local python server and open the file in the browser
-        launch_html_page(file_path)
+        # Create a local server and open the file in the browser, keep serving until ctrl+c
+        html_server = launch_html_page(file_path, cross_origin_isolated=cross_origin_isolated)
+        if html_server:
+            html_server.wait()
+
+    elif profile:
+        # Run under a profiler and write a flame graph next to the file
+        profile_executable(file_path)
 
     elif file_extension == "exe" or file_extension == "out":
         # Navigate to where the file is located and invoke the file
@@ -128,32 +2647,346 @@ def invoke_file(file_path: str):
         run_command('"' + file_path + '"')
 
 
-def launch_html_page(html_file_path: str):
+def launch_html_page(html_file_path: str, port: int = 8000, live_reload: bool = False, cross_origin_isolated: bool = False) -> "StaticFileServer":
     import webbrowser
-    """ Start the webbrowser if not already open and launch the html page
+    """ Start a local server for the folder of the html page in the background, and open the page in the webbrowser
 
     Parameters
     ----------
         html_file_path (str): The path to the html file that should be shown in the browser
+        port (int): The port to serve on, the next free port is used if it is taken
+        live_reload (bool): Let the page reload itself when StaticFileServer.notify_reload() is called
+        cross_origin_isolated (bool): Send the COOP/COEP headers that SharedArrayBuffer requires, needed for pthreads builds
 
     Returns
     -------
-        None
+        StaticFileServer: The running server, call stop() on it when done
     """
-    os.chdir(path_traverse_up(html_file_path, count=0))
     if not (os.path.exists(html_file_path)):
         print("html file does not exist!")
-        return
-    
+        return None
+
+    headers = CROSS_ORIGIN_ISOLATION_HEADERS if cross_origin_isolated else dict()
+    html_server = StaticFileServer(path_traverse_up(html_file_path, count=0), port=port, headers=headers, live_reload=live_reload)
+    html_server.start()
+
     file_name: str = html_file_path.replace("\\", "/").rsplit("/", maxsplit=1)[-1]
-    webbrowser.open("http://localhost:8000/" + file_name, new=0, autoraise=True)
+    webbrowser.open(html_server.get_url(file_name), new=0, autoraise=True)
+    return html_server
+
+
+# Browsers only allow SharedArrayBuffer(used for the memory shared between threads) on cross origin isolated pages.
+# Resources from other origins then need to opt in using Cross-Origin-Resource-Policy or CORS
+CROSS_ORIGIN_ISOLATION_HEADERS = {
+    "Cross-Origin-Opener-Policy": "same-origin",
+    "Cross-Origin-Embedder-Policy": "require-corp",
+}
+
+
+PRECOMPRESSED_EXTENSIONS = [".wasm", ".js", ".html", ".data", ".css", ".json", ".svg"]
+
+
+def precompress_files(directory: str, extensions: List[str] = PRECOMPRESSED_EXTENSIONS, min_size: int = 1024):
+    """Write a gzip(.gz) and a brotli(.br) compressed copy next to each file in the directory that the local server may send
 
+    Files that have not changed since they were last compressed are skipped. 
+    Brotli is only used if the brotli python package is installed
+    """
     try:
-        run_command("python3 -m http.server")
-    except Exception as e:
-        pass
+        import brotli
+    except ImportError:
+        brotli = None
+
+    for entry in os.scandir(directory):
+        if not entry.is_file() or os.path.splitext(entry.name)[1] not in extensions:
+            continue
+        file_stat = entry.stat()
+        if file_stat.st_size < min_size:
+            continue
+
+        data = None
+        for encoding_extension in [".gz", ".br"] if brotli else [".gz"]:
+            compressed_file_path = entry.path + encoding_extension
+            if os.path.exists(compressed_file_path) and os.path.getmtime(compressed_file_path) >= file_stat.st_mtime:
+                continue
+            if data is None:
+                with open(entry.path, "rb") as file:
+                    data = file.read()
+            if encoding_extension == ".gz":
+                compressed_data = gzip.compress(data, compresslevel=9, mtime=0)
+            else:
+                compressed_data = brotli.compress(data, quality=9) # 11 is much slower for large wasm files, for little gain
+            with open(compressed_file_path + ".tmp", "wb") as file:
+                file.write(compressed_data)
+            os.replace(compressed_file_path + ".tmp", compressed_file_path)
+
+
+LIVE_RELOAD_PATH = "/__live_reload"
+LIVE_RELOAD_SCRIPT = b"""<script>
+(function() {
+    var version = null;
+    function poll() {
+        fetch("%s" + (version === null ? "" : "?version=" + version)).then(function(response) { return response.text(); }).then(function(text) {
+            if (version !== null && text !== version) { location.reload(); return; }
+            version = text;
+            poll();
+        }).catch(function() { setTimeout(poll, 1000); });
+    }
+    poll();
+})();
+</script>
+""" % LIVE_RELOAD_PATH.encode()
+
+
+class StaticFileServer:
+    """Serve the files in a directory over http in a background thread, eg the output from emscripten
+
+    - Sends .wasm files as application/wasm, so the browser can compile them while downloading
+    - Sends the precompressed .br or .gz file if the browser accepts it, see precompress_files
+    - ETag and If-None-Match, so unchanged files are answered with 304 Not Modified
+    - Range requests, for large .data files
+    - Each request is handled in its own thread
+    """
+    def __init__(self, directory: str, port: int = 8000, headers: dict = None, live_reload: bool = False):
+        self.directory = os.path.abspath(directory)
+        self.port = port
+        self.headers = headers or dict()
+        self.live_reload = live_reload
+        self.reload_version = 0
+        self.reload_condition = threading.Condition()
+        self.http_server: http.server.ThreadingHTTPServer = None
+        self.thread: threading.Thread = None
+
+    def start(self):
+        """Start serving in the background, tries the next few ports if the port is already in use"""
+        handler_class = type("StaticFileRequestHandler", (StaticFileRequestHandler,), {"static_file_server": self})
+        for port in range(self.port, self.port + 20):
+            try:
+                self.http_server = http.server.ThreadingHTTPServer(("localhost", port), handler_class)
+                break
+            except OSError:
+                continue
+        else:
+            raise Exception(f"no free port found in {self.port}-{self.port + 19}")
+        self.http_server.daemon_threads = True
+        self.port = self.http_server.server_address[1]
+
+        self.thread = threading.Thread(target=self.http_server.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"serving {self.directory} at {self.get_url()}")
+
+    def get_url(self, file_name: str = "") -> str:
+        return f"http://localhost:{self.port}/{file_name}"
+
+    def notify_reload(self):
+        """Make all the open pages reload themselves, if live_reload is enabled"""
+        with self.reload_condition:
+            self.reload_version += 1
+            self.reload_condition.notify_all()
+
+    def wait(self):
+        """Block until ctrl+c, then stop the server"""
+        try:
+            while self.thread.is_alive():
+                self.thread.join(timeout=0.5)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        if self.http_server:
+            self.http_server.shutdown()
+            self.http_server.server_close()
+            self.http_server = None
+
+
+class StaticFileRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep connections alive between requests
+    static_file_server: StaticFileServer = None
+
+    mime_types = {
+        ".wasm": "application/wasm",
+        ".js": "text/javascript",
+        ".mjs": "text/javascript",
+        ".html": "text/html; charset=utf-8",
+        ".css": "text/css",
+        ".json": "application/json",
+        ".data": "application/octet-stream",
+    }
+
+    def do_HEAD(self):
+        self.do_GET(send_body=False)
+
+    def do_GET(self, send_body: bool = True):
+        url_path, _, query = self.path.partition("?")
+        if url_path == LIVE_RELOAD_PATH and self.static_file_server.live_reload:
+            return self.send_reload_version(query)
+
+        file_path = self.get_file_path(url_path)
+        if file_path is None:
+            return self.send_error_response(404)
+
+        file_extension = os.path.splitext(file_path)[1]
+        content_type = self.mime_types.get(file_extension) or mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        file_stat = os.stat(file_path)
 
-    run_command("python -m http.server")
+        if file_extension == ".html" and self.static_file_server.live_reload:
+            # The page is small, so add the reload script in memory
+            with open(file_path, "rb") as file:
+                data = file.read()
+            body_index = data.rfind(b"</body>")
+            data = data[:body_index] + LIVE_RELOAD_SCRIPT + data[body_index:] if body_index != -1 else data + LIVE_RELOAD_SCRIPT
+            self.send_response(200)
+            self.send_common_headers(content_type, len(data))
+            self.end_headers()
+            if send_body:
+                self.wfile.write(data)
+            return
+
+        # Ranges refer to the uncompressed file, so only use the compressed variants for whole files
+        range_header = self.headers.get("Range")
+        if range_header is not None and "," in range_header:
+            range_header = None # Multiple ranges are not supported, the whole file is sent instead which RFC 9110 allows
+        content_encoding = None
+        if range_header is None:
+            file_path, content_encoding = self.get_precompressed_file(file_path, file_stat)
+            if content_encoding:
+                file_stat = os.stat(file_path)
+
+        etag = f'"{file_stat.st_mtime_ns:x}-{file_stat.st_size:x}{"-" + content_encoding if content_encoding else ""}"'
+        if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_common_headers(None, 0)
+            self.end_headers()
+            return
+
+        start, end = 0, file_stat.st_size - 1
+        if range_header is not None:
+            byte_range = self.parse_range(range_header, file_stat.st_size)
+            if byte_range is None:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{file_stat.st_size}")
+                self.send_common_headers(None, 0)
+                self.end_headers()
+                return
+            start, end = byte_range
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{file_stat.st_size}")
+        else:
+            self.send_response(200)
+
+        self.send_header("ETag", etag)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Vary", "Accept-Encoding")
+        if content_encoding:
+            self.send_header("Content-Encoding", content_encoding)
+        self.send_common_headers(content_type, end - start + 1)
+        self.end_headers()
+        if send_body:
+            self.send_file_range(file_path, start, end - start + 1)
+
+    def get_file_path(self, url_path: str) -> str:
+        """Get the file to serve for the url, None if it is missing or outside of the served directory"""
+        import urllib.parse
+        relative_path = urllib.parse.unquote(url_path).lstrip("/")
+        file_path = os.path.abspath(os.path.join(self.static_file_server.directory, relative_path))
+        if file_path != self.static_file_server.directory and not file_path.startswith(self.static_file_server.directory + os.sep):
+            return None
+        if os.path.isdir(file_path):
+            file_path = os.path.join(file_path, "index.html")
+        if not os.path.isfile(file_path):
+            return None
+        return file_path
+
+    def get_precompressed_file(self, file_path: str, file_stat: os.stat_result):
+        """Get the best compressed file the browser accepts, that is up to date with the original file"""
+        quality_values = self.parse_accept_encoding(self.headers.get("Accept-Encoding", ""))
+        get_quality = lambda content_encoding: quality_values.get(content_encoding, quality_values.get("*", 0.0))
+        # Prefer br over gzip when the browser accepts both equally
+        for content_encoding, encoding_extension in sorted([("br", ".br"), ("gzip", ".gz")], key=lambda encoding: -get_quality(encoding[0])):
+            if get_quality(content_encoding) <= 0:
+                continue
+            compressed_file_stat = get_modified_time(file_path + encoding_extension)
+            if compressed_file_stat and compressed_file_stat[0] >= file_stat.st_mtime_ns:
+                return file_path + encoding_extension, content_encoding
+        return file_path, None
+
+    @staticmethod
+    def parse_accept_encoding(accept_encoding: str) -> dict:
+        """Parse the Accept-Encoding header into encoding -> q value, eg "br;q=0, gzip" -> {"br": 0.0, "gzip": 1.0}. A q value of 0 means not accepted"""
+        quality_values = dict()
+        for encoding in accept_encoding.split(","):
+            parameters = [parameter.strip() for parameter in encoding.split(";")]
+            if parameters[0] == "":
+                continue
+            quality = 1.0
+            for parameter in parameters[1:]:
+                name, _, value = parameter.partition("=")
+                if name.strip().lower() == "q":
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            quality_values[parameters[0].lower()] = quality
+        return quality_values
+
+    @staticmethod
+    def parse_range(range_header: str, file_size: int):
+        """Parse a single range, eg "bytes=0-99", "bytes=100-" or "bytes=-100". Returns (start, end) inclusive, or None"""
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+        if not match or (match.group(1) == "" and match.group(2) == ""):
+            return None
+        if match.group(1) == "":
+            start, end = max(file_size - int(match.group(2)), 0), file_size - 1
+        else:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), file_size - 1) if match.group(2) != "" else file_size - 1
+        if start > end or start >= file_size:
+            return None
+        return start, end
+
+    def send_file_range(self, file_path: str, start: int, length: int):
+        with open(file_path, "rb") as file:
+            file.seek(start)
+            while length > 0:
+                chunk = file.read(min(length, 256 * 1024))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                length -= len(chunk)
+
+    def send_reload_version(self, query: str):
+        """Wait until the reload version differs from the one the page has, or a timeout, then send the current version"""
+        import urllib.parse
+        page_version = urllib.parse.parse_qs(query).get("version", [None])[0]
+        with self.static_file_server.reload_condition:
+            self.static_file_server.reload_condition.wait_for(lambda: str(self.static_file_server.reload_version) != page_version, timeout=25)
+            data = str(self.static_file_server.reload_version).encode()
+        self.send_response(200)
+        self.send_common_headers("text/plain", len(data))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_response(self, status: int):
+        data = (str(status) + " " + self.responses[status][0]).encode()
+        self.send_response(status)
+        self.send_common_headers("text/plain", len(data))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    def send_common_headers(self, content_type: str, content_length: int):
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(content_length))
+        self.send_header("Cache-Control", "no-cache") # Always revalidate using the etag, since the files change on each build
+        for header_name, header_value in self.static_file_server.headers.items():
+            self.send_header(header_name, header_value)
+
+    def log_message(self, format, *args):
+        pass
 
 
 # Get the defualt compiler path within vicmil lib
@@ -231,4 +3064,189 @@ def add_asio_flags(build_setup: BuildSetup, browser = False):
         build_setup.n8_library_files += " -lws2_32" # Needed to make it compile with mingw compiler
 
     else:
-        print("asio include not implemented for ", platform_name)
\ No newline at end of file
+        print("asio include not implemented for ", platform_name)
+
+
+# Glm is used for vector and matrix math
+def add_glm_flags(build_setup: BuildSetup):
+    build_setup.n6_include_paths += ' -I"' + build_setup.deps_dir + "/glm" + '"'
+
+
+# Stb is used for loading and saving images
+def add_stb_flags(build_setup: BuildSetup):
+    build_setup.n6_include_paths += ' -I"' + build_setup.deps_dir + "/stb" + '"'
+
+
+def add_pthread_flags(build_setup: BuildSetup, pool_size = "navigator.hardwareConcurrency", browser = False):
+    build_setup.n5_additional_compiler_settings += " -pthread"
+    if browser:
+        build_setup.n5_additional_compiler_settings += " -s USE_PTHREADS=1"
+        build_setup.n5_additional_compiler_settings += " -s PTHREAD_POOL_SIZE=" + str(pool_size)
+
+
+# util_std.hpp includes "mingw-std-threads/mingw.thread.h" when compiling using mingw
+def add_mingw_std_threads_flags(build_setup: BuildSetup, browser = False):
+    if not browser and platform.system() == "Windows":
+        build_setup.n6_include_paths += ' -I"' + build_setup.deps_dir + '"'
+
+
+# The dependencies that are shipped as zip archives next to cpp_build.py
+BUNDLED_DEPENDENCIES = ["asio", "glm", "stb", "mingw-std-threads"]
+
+
+def extract_dependencies(deps_dir: str, dependency_names: List[str] = None, archive_dir: str = None, jobs: int = None) -> bool:
+    """Extract the dependency archives into deps_dir, skipping the ones that have not changed since they were last extracted
+
+    Parameters
+    ----------
+        deps_dir (str): Where to extract the dependencies, eg BuildSetup.deps_dir
+        dependency_names (List[str]): The archives to extract, eg ["asio"] for asio.zip, defaults to BUNDLED_DEPENDENCIES
+        archive_dir (str): Where to find the archives, defaults to the directory of cpp_build.py
+        jobs (int): How many archives to extract at the same time
+
+    Returns
+    -------
+        bool: True if all the dependencies are available in deps_dir
+    """
+    dependency_names = list(BUNDLED_DEPENDENCIES if dependency_names is None else dependency_names)
+    archive_dir = archive_dir or path_traverse_up(__file__, 0)
+
+    def extract_dependency(dependency_name: str) -> bool:
+        archive_path = archive_dir + "/" + dependency_name + ".zip"
+        if not os.path.exists(archive_path):
+            if os.path.exists(deps_dir + "/" + dependency_name):
+                return True # Already set up some other way
+            print("missing dependency " + dependency_name + ", " + archive_path + " does not exist")
+            return False
+        try:
+            extract_archive_if_changed(archive_path, deps_dir)
+            return True
+        except Exception as e:
+            print("failed to extract " + archive_path + ": " + str(e))
+            return False
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs or len(dependency_names) or 1) as executor:
+        return all(executor.map(extract_dependency, dependency_names))
+
+
+def extract_archive_if_changed(archive_path: str, output_dir: str) -> bool:
+    """Extract a zip archive into output_dir, unless the same archive was already extracted there
+
+    A stamp file with the hash of the archive is written next to the extracted files, 
+    to check if the archive has changed. The file size and modification time are checked first, 
+    so the archive only has to be hashed again if it has been touched
+
+    Returns
+    -------
+        bool: True if the archive was extracted, False if it was already up to date
+    """
+    archive_name = pathlib.Path(archive_path).stem
+    stamp_file_path = output_dir + "/." + archive_name + ".stamp"
+    archive_stat = os.stat(archive_path)
+
+    stamp = dict()
+    if os.path.exists(stamp_file_path):
+        with open(stamp_file_path, "r") as file:
+            try:
+                stamp = json.load(file)
+            except json.JSONDecodeError:
+                pass
+
+    archive_hash = None
+    if stamp.get("size") == archive_stat.st_size and stamp.get("mtime_ns") == archive_stat.st_mtime_ns:
+        archive_hash = stamp.get("sha256")
+    if archive_hash is None:
+        archive_hash = get_file_hash(archive_path)
+
+    extracted_paths = stamp.get("extracted_paths", [])
+    if stamp.get("sha256") == archive_hash and all([os.path.exists(output_dir + "/" + path) for path in extracted_paths]):
+        if stamp.get("mtime_ns") != archive_stat.st_mtime_ns:
+            stamp.update({"size": archive_stat.st_size, "mtime_ns": archive_stat.st_mtime_ns})
+            write_json_file(stamp_file_path, stamp)
+        return False
+
+    print("extracting " + archive_path + " into " + output_dir)
+
+    # Extract into a temporary directory first, so an interrupted extraction is never mistaken for a complete one
+    temporary_dir = output_dir + "/." + archive_name + ".tmp"
+    if os.path.exists(temporary_dir):
+        shutil.rmtree(temporary_dir)
+    os.makedirs(temporary_dir)
+
+    top_level_paths = set()
+    with zipfile.ZipFile(archive_path) as archive:
+        for entry in archive.infolist():
+            target_path = os.path.realpath(os.path.join(temporary_dir, entry.filename))
+            if not target_path.startswith(os.path.realpath(temporary_dir) + os.sep):
+                raise Exception("invalid path in archive: " + entry.filename)
+            top_level_paths.add(entry.filename.replace("\\", "/").split("/")[0])
+
+            if entry.is_dir():
+                os.makedirs(target_path, exist_ok=True)
+                continue
+
+            # Stream the entry to disk, instead of reading the whole file into memory
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            with archive.open(entry) as source, open(target_path, "wb") as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+
+            permissions = (entry.external_attr >> 16) & 0o777
+            if permissions & 0o111:
+                os.chmod(target_path, permissions) # Keep scripts executable
+
+    # Replace the previously extracted files
+    for path in sorted(top_level_paths | set(extracted_paths)):
+        if os.path.isdir(output_dir + "/" + path):
+            shutil.rmtree(output_dir + "/" + path)
+        elif os.path.exists(output_dir + "/" + path):
+            os.remove(output_dir + "/" + path)
+    for path in sorted(top_level_paths):
+        os.replace(temporary_dir + "/" + path, output_dir + "/" + path)
+    shutil.rmtree(temporary_dir)
+
+    write_json_file(stamp_file_path, {
+        "sha256": archive_hash,
+        "size": archive_stat.st_size,
+        "mtime_ns": archive_stat.st_mtime_ns,
+        "extracted_paths": sorted(top_level_paths),
+    })
+    return True
+
+
+def get_file_hash(file_path: str) -> str:
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def write_json_file(file_path: str, contents: dict):
+    # Write to a temporary file first, so the file is never partially written
+    temporary_path = file_path + "." + str(os.getpid()) + ".tmp"
+    with open(temporary_path, "w") as file:
+        json.dump(contents, file, indent=4)
+    os.replace(temporary_path, file_path)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Commands for preparing a machine for building, eg a ci container")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    warm_parser = subparsers.add_parser("warm-emscripten-cache", help="Build the emscripten ports(SDL2, SDL2_image) and system libraries into a cache directory")
+    warm_parser.add_argument("--cache-dir", required=True)
+    warm_parser.add_argument("--deps-dir", default=path_traverse_up(__file__, 0) + "/deps")
+    warm_parser.add_argument("--profile", action="append", choices=["debug", "release", "size", "native"], help="Can be given multiple times, defaults to debug and release")
+    warm_parser.add_argument("--pthreads", action="store_true")
+
+    args = parser.parse_args()
+    if args.command == "warm-emscripten-cache":
+        for profile_name in args.profile or ["debug", "release"]:
+            build_setup = BuildSetup([], deps_dir=args.deps_dir, browser=True)
+            build_setup.include_opengl()
+            if args.pthreads:
+                build_setup.enable_pthreads()
+            build_setup.set_profile(profile_name)
+            if not build_setup.warm_emscripten_cache(args.cache_dir):
+                sys.exit(1)
@@ -0,0 +1,273 @@
+"""
+Run the tests registered using TestWrapper/AddTest in util_std.hpp, each test in its own process,
+with many tests running at the same time. The test binary is built once, and main() should call
+vicmil::TestClass::run_tests_from_arguments(argc, argv)
+
+When starting a process is expensive compared to the tests, use batch_size(--batch-size) to run
+several tests in each process instead
+
+Example:
+    build_setup = BuildSetup(cpp_file_paths=[path_traverse_up(__file__, 0) + "/tests.cpp"])
+    build_and_run_tests(build_setup, timeout=30, junit_xml_path="test_results.xml")
+
+Or from the terminal, for an already built binary:
+    python3 cpp_test_runner.py bin/run.out --jobs 8 --timeout 30 --junit test_results.xml --json test_results.json
+"""
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[0]))
+from cpp_build import *
+
+import signal
+import queue
+import xml.etree.ElementTree as ET
+
+BATCH_START_MARKER = "<<<<<<< start test: "
+BATCH_END_MARKER = "<<<<<<< end test: "
+
+
+class TestResult:
+    def __init__(self, test_name: str):
+        self.test_name = test_name
+        self.status = "not run" # passed, failed or timeout
+        self.return_code = None
+        self.duration = 0.0
+        self.output = ""
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.test_name,
+            "status": self.status,
+            "return_code": self.return_code,
+            "duration": self.duration,
+            "output": self.output,
+        }
+
+
+def list_tests(executable_path: str) -> List[str]:
+    """Get the names of the tests registered in the test binary"""
+    process = subprocess.run([executable_path, "--list-tests"], cwd=path_traverse_up(executable_path, 0),
+                             stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=60)
+    if process.returncode != 0:
+        raise Exception("listing the tests failed:\n" + process.stdout.decode(errors="replace"))
+    return [line.strip() for line in process.stdout.decode(errors="replace").splitlines() if len(line.strip()) > 0]
+
+
+def get_shard_tests(test_names: List[str], shard_index: int, shard_count: int) -> List[str]:
+    """Split the tests between shard_count machines, the same test always ends up in the same shard"""
+    return [test_name for test_name in test_names
+            if int(hashlib.sha1(test_name.encode()).hexdigest(), 16) % shard_count == shard_index]
+
+
+def kill_process_group(process: subprocess.Popen):
+    """Kill a process started with start_new_session=True and anything it started"""
+    if platform.system() != "Windows":
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass # It already exited
+    else:
+        process.kill()
+
+
+def run_test(executable_path: str, test_name: str, timeout: float) -> TestResult:
+    """Run a single test in its own process, the process(and anything it started) is killed if it takes longer than timeout seconds"""
+    result = TestResult(test_name)
+    start_time = time.perf_counter()
+    process = subprocess.Popen([executable_path, "--run-test", test_name], cwd=path_traverse_up(executable_path, 0),
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, start_new_session=(platform.system() != "Windows"))
+    try:
+        output, _ = process.communicate(timeout=timeout)
+        result.status = "passed" if process.returncode == 0 else "failed"
+    except subprocess.TimeoutExpired:
+        kill_process_group(process)
+        output, _ = process.communicate()
+        result.status = "timeout"
+
+    result.duration = time.perf_counter() - start_time
+    result.return_code = process.returncode
+    result.output = output.decode(errors="replace")
+    return result
+
+
+def run_test_batch(executable_path: str, test_names: List[str], timeout: float) -> List[TestResult]:
+    """Run several tests in the same process using --run-tests, the process is killed if a single test takes longer than timeout seconds.
+    The tests that never got to run, because an earlier test in the batch crashed or timed out, are run again in their own process"""
+    process = subprocess.Popen([executable_path, "--run-tests"] + test_names, cwd=path_traverse_up(executable_path, 0),
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, start_new_session=(platform.system() != "Windows"))
+    # Read the output in a thread, so the time of the current test can be checked while waiting for it
+    lines = queue.Queue()
+    def read_lines():
+        for line in iter(process.stdout.readline, b""):
+            lines.put(line)
+        lines.put(None)
+    threading.Thread(target=read_lines, daemon=True).start()
+
+    results = dict()
+    current_result = None
+    output_lines = []
+    test_start_time = time.perf_counter()
+    timed_out = False
+    while True:
+        try:
+            line = lines.get(timeout=None if timeout is None else max(0.0, test_start_time + timeout - time.perf_counter()))
+        except queue.Empty:
+            timed_out = True
+            kill_process_group(process)
+            break
+        if line is None:
+            break
+        line = line.decode(errors="replace")
+        if line.startswith(BATCH_START_MARKER):
+            current_result = TestResult(line[len(BATCH_START_MARKER):].rstrip("\r\n"))
+            output_lines = []
+            test_start_time = time.perf_counter()
+        elif line.startswith(BATCH_END_MARKER) and current_result is not None:
+            _, status, duration = line[len(BATCH_END_MARKER):].rstrip("\r\n").rsplit(" ", 2)
+            current_result.status = status
+            current_result.return_code = 0 if status == "passed" else 1
+            current_result.duration = float(duration)
+            current_result.output = "".join(output_lines)[:-1] # The newline printed before the end line
+            results[current_result.test_name] = current_result
+            current_result = None
+        else:
+            output_lines.append(line)
+    process.wait()
+    process.stdout.close()
+
+    if current_result is not None: # The test crashed or timed out
+        current_result.status = "timeout" if timed_out else "failed"
+        current_result.return_code = process.returncode
+        current_result.duration = time.perf_counter() - test_start_time
+        current_result.output = "".join(output_lines)
+        results[current_result.test_name] = current_result
+    return [results[test_name] if test_name in results else run_test(executable_path, test_name, timeout) for test_name in test_names]
+
+
+def run_tests(executable_path: str, jobs: int = None, timeout: float = 60, test_filter: str = None,
+              shard_index: int = 0, shard_count: int = 1, junit_xml_path: str = None, json_path: str = None,
+              batch_size: int = 1) -> List[TestResult]:
+    """Run the tests in the test binary in parallel, and print a summary with the slowest tests
+
+    Parameters
+    ----------
+        executable_path (str): The test binary
+        jobs (int): How many tests to run at the same time, defaults to the number of cpu cores
+        timeout (float): The maximum time in seconds for each test
+        test_filter (str): Only run the tests whose name matches this regex
+        shard_index (int): Which part of the tests to run when splitting them between shard_count machines, starting at 0
+        shard_count (int): How many machines the tests are split between
+        junit_xml_path (str): Write the results as junit xml, which most ci systems can show
+        json_path (str): Write the results as json
+        batch_size (int): How many tests to run in each process, a test that crashes the process makes the rest of its batch run in their own processes
+
+    Returns
+    -------
+        List[TestResult]: The result of each test, in the order they were listed
+    """
+    executable_path = os.path.abspath(executable_path)
+    test_names = list_tests(executable_path)
+    if test_filter:
+        test_names = [test_name for test_name in test_names if re.search(test_filter, test_name)]
+    test_names = get_shard_tests(test_names, shard_index, shard_count)
+
+    jobs = jobs or os.cpu_count() or 1
+    print(f"running {len(test_names)} tests using {jobs} jobs" + (f" (shard {shard_index + 1}/{shard_count})" if shard_count > 1 else ""))
+
+    start_time = time.perf_counter()
+    results = dict()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        if batch_size > 1:
+            batches = [test_names[i:i + batch_size] for i in range(0, len(test_names), batch_size)]
+            futures = [executor.submit(run_test_batch, executable_path, batch, timeout) for batch in batches]
+        else:
+            futures = [executor.submit(lambda test_name: [run_test(executable_path, test_name, timeout)], test_name) for test_name in test_names]
+        for future in concurrent.futures.as_completed(futures):
+            for result in future.result():
+                results[result.test_name] = result
+                print(f"[{len(results)}/{len(test_names)}] {result.status}: {result.test_name} ({result.duration:.2f}s)")
+                if result.status != "passed" and len(result.output) > 0:
+                    print(result.output.rstrip())
+    wall_time = time.perf_counter() - start_time
+    results = [results[test_name] for test_name in test_names]
+
+    print_test_summary(results, wall_time)
+    if junit_xml_path:
+        write_junit_xml(results, junit_xml_path, suite_name=Path(executable_path).stem)
+    if json_path:
+        write_json_file(json_path, {"wall_time": wall_time, "tests": [result.to_dict() for result in results]})
+    return results
+
+
+def print_test_summary(results: List[TestResult], wall_time: float, slowest_count: int = 5):
+    passed_count = len([result for result in results if result.status == "passed"])
+    total_duration = sum([result.duration for result in results])
+
+    print("slowest tests:")
+    for result in sorted(results, key=lambda result: result.duration, reverse=True)[:slowest_count]:
+        print(f"  {result.duration:8.2f}s  {result.test_name}")
+
+    for result in results:
+        if result.status != "passed":
+            print(f"{result.status}: {result.test_name}")
+    print(f"{passed_count}/{len(results)} tests passed in {wall_time:.2f}s ({total_duration:.2f}s of test time)")
+
+
+def write_junit_xml(results: List[TestResult], file_path: str, suite_name: str = "tests"):
+    test_suite = ET.Element("testsuite", {
+        "name": suite_name,
+        "tests": str(len(results)),
+        "failures": str(len([result for result in results if result.status == "failed"])),
+        "errors": str(len([result for result in results if result.status == "timeout"])),
+        "time": f"{sum([result.duration for result in results]):.3f}",
+    })
+    for result in results:
+        test_case = ET.SubElement(test_suite, "testcase", {"classname": suite_name, "name": result.test_name, "time": f"{result.duration:.3f}"})
+        if result.status == "failed":
+            failure = ET.SubElement(test_case, "failure", {"message": f"exit code {result.return_code}"})
+            failure.text = result.output
+        elif result.status == "timeout":
+            error = ET.SubElement(test_case, "error", {"message": "timeout"})
+            error.text = result.output
+        ET.SubElement(test_case, "system-out").text = result.output
+
+    os.makedirs(path_traverse_up(file_path, 0), exist_ok=True)
+    ET.ElementTree(test_suite).write(file_path, encoding="utf-8", xml_declaration=True)
+
+
+def build_and_run_tests(build_setup: BuildSetup, jobs: int = None, timeout: float = 60, test_filter: str = None,
+                        shard_index: int = 0, shard_count: int = 1, junit_xml_path: str = None, json_path: str = None,
+                        batch_size: int = 1) -> bool:
+    """Build the test binary once, then run the tests in parallel, see run_tests
+
+    Returns
+    -------
+        bool: True if the build succeeded and all the tests passed
+    """
+    if build_setup.browser_flag:
+        raise Exception("Running tests is not supported for the browser")
+    if not build_setup.build():
+        return False
+    results = run_tests(build_setup.n9_output_file, jobs=jobs, timeout=timeout, test_filter=test_filter, shard_index=shard_index,
+                        shard_count=shard_count, junit_xml_path=junit_xml_path, json_path=json_path, batch_size=batch_size)
+    return all([result.status == "passed" for result in results])
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Run the tests in a test binary built with util_std.hpp in parallel")
+    parser.add_argument("executable_path")
+    parser.add_argument("--jobs", type=int, default=None)
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds per test")
+    parser.add_argument("--filter", default=None, help="Only run the tests matching this regex")
+    parser.add_argument("--shard", default="1/1", help="Which part of the tests to run, eg 2/4 for the second of four parts")
+    parser.add_argument("--junit", default=None, help="Write junit xml results to this file")
+    parser.add_argument("--json", default=None, help="Write json results to this file")
+    parser.add_argument("--batch-size", type=int, default=1, help="How many tests to run in each process")
+    args = parser.parse_args()
+
+    shard_number, shard_count = [int(part) for part in args.shard.split("/")]
+    results = run_tests(args.executable_path, jobs=args.jobs, timeout=args.timeout, test_filter=args.filter, shard_index=shard_number - 1,
+                        shard_count=shard_count, junit_xml_path=args.junit, json_path=args.json, batch_size=args.batch_size)
+    sys.exit(0 if all([result.status == "passed" for result in results]) else 1)
@@ -0,0 +1,277 @@
+"""
+Search large log files without reading all of them, eg the logs written by invoke_python_file_using_subprocess
+
+A sparse index is kept next to the log file(<log file>.idx), with the byte offset, line number and timestamp
+of a line every 64kb. The index is brought up to date before each search, by only reading what was added
+to the log since last time. A search for a time range then jumps straight to the right part of the file
+
+Example:
+    log_index = LogIndex("server.log")
+    for line_number, line in log_index.search_time_range("2024-05-01 10:00", "2024-05-01 10:05"):
+        print(line)
+    for line_number, line in log_index.search("Traceback"):
+        print(line_number, line)
+
+Or from the terminal:
+    python3 log_index.py server.log --from "2024-05-01 10:00" --to "2024-05-01 10:05" --grep Traceback
+"""
+
+import os
+import re
+import mmap
+import struct
+import bisect
+import hashlib
+import datetime
+
+TIMESTAMP_PATTERN = re.compile(rb"(\d{4})-(\d{2})-(\d{2})(?:[ T](\d{2}):(\d{2})(?::(\d{2}))?(?:[.,](\d+))?)?")
+
+
+def parse_log_timestamp(line: bytes) -> float:
+    """Get the timestamp at the start of a log line as seconds since the epoch(local time),
+    eg "2024-05-01 10:00:00,123 INFO ..." as written by the logging module. Returns None if there is none
+    """
+    match = TIMESTAMP_PATTERN.search(line, 0, 64)
+    if not match:
+        return None
+    year, month, day, hour, minute, second, fraction = match.groups()
+    try:
+        timestamp = datetime.datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0)).timestamp()
+    except ValueError:
+        return None
+    if fraction:
+        timestamp += int(fraction) / 10 ** len(fraction)
+    return timestamp
+
+
+def to_timestamp(time_value) -> float:
+    """Convert a datetime, a string such as "2024-05-01 10:00" or seconds since the epoch into seconds since the epoch"""
+    if time_value is None:
+        return None
+    if isinstance(time_value, datetime.datetime):
+        return time_value.timestamp()
+    if isinstance(time_value, str):
+        timestamp = parse_log_timestamp(time_value.encode())
+        if timestamp is None:
+            raise ValueError("invalid time: " + time_value + ", expected eg 2024-05-01 10:00:00")
+        return timestamp
+    return float(time_value)
+
+
+class LogIndex:
+    """A sparse index of a log file, for searching by time range or text without reading the whole file"""
+    MAGIC = b"LOGIDX1\0"
+    HEADER = struct.Struct("<8sQQ20s") # magic, interval, length of the hashed start of the log, hash of the start of the log
+    ENTRY = struct.Struct("<QQd") # byte offset, line number, timestamp(nan if there is none yet)
+    HASHED_LENGTH = 4096
+
+    def __init__(self, log_path: str, interval: int = 64 * 1024, parse_timestamp = parse_log_timestamp):
+        """
+        Parameters
+        ----------
+            log_path (str): The log file
+            interval (int): How many bytes of the log there are between each index entry
+            parse_timestamp: Gets the timestamp of a line(bytes) as seconds, or None if the line has no timestamp
+        """
+        self.log_path = log_path
+        self.index_path = log_path + ".idx"
+        self.interval = interval
+        self.parse_timestamp = parse_timestamp
+        self.entries = [] # (offset, line number, timestamp)
+        self.hashed_length = 0
+        self.hashed_start = b""
+
+    def update(self) -> int:
+        """Index what was added to the log since the last update, rebuilds the index if the log was truncated or replaced
+
+        Returns
+        -------
+            int: The number of new index entries
+        """
+        if not os.path.exists(self.log_path) or os.path.getsize(self.log_path) == 0:
+            self.entries = []
+            return 0
+
+        with open(self.log_path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as log_data:
+            if len(self.entries) == 0:
+                self.load()
+            if not self.is_valid(log_data):
+                self.create(log_data)
+
+            # Only index complete lines, the last line may still be being written
+            end = log_data.rfind(b"\n") + 1
+            new_entries = []
+            if len(self.entries) == 0:
+                new_entries.append((0, 0, self.find_timestamp(log_data, 0, end, None)))
+            offset, line_number, timestamp = (self.entries + new_entries)[-1]
+
+            while offset + self.interval < end:
+                newline = log_data.find(b"\n", offset + self.interval - 1, end)
+                if newline == -1 or newline + 1 >= end:
+                    break
+                line_number += log_data[offset:newline + 1].count(b"\n")
+                offset = newline + 1
+                timestamp = self.find_timestamp(log_data, offset, end, timestamp)
+                new_entries.append((offset, line_number, timestamp))
+
+        if len(new_entries) > 0:
+            with open(self.index_path, "ab") as index_file:
+                for entry in new_entries:
+                    index_file.write(self.ENTRY.pack(entry[0], entry[1], entry[2] if entry[2] is not None else float("nan")))
+            self.entries += new_entries
+        return len(new_entries)
+
+    def load(self):
+        """Read the index file, if it exists and was created with the same interval"""
+        self.entries = []
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "rb") as index_file:
+            data = index_file.read()
+        if len(data) < self.HEADER.size:
+            return
+        magic, interval, self.hashed_length, self.hashed_start = self.HEADER.unpack_from(data, 0)
+        if magic != self.MAGIC or interval != self.interval:
+            return
+        entry_count = (len(data) - self.HEADER.size) // self.ENTRY.size # Ignore a partly written last entry
+        for i in range(entry_count):
+            offset, line_number, timestamp = self.ENTRY.unpack_from(data, self.HEADER.size + i * self.ENTRY.size)
+            self.entries.append((offset, line_number, None if timestamp != timestamp else timestamp))
+
+    def is_valid(self, log_data: mmap.mmap) -> bool:
+        """Check that the index belongs to this log file, by comparing the start of the file and that it has not shrunk"""
+        if len(self.entries) == 0 or self.hashed_length > len(log_data) or self.entries[-1][0] > len(log_data):
+            return False
+        return hashlib.sha1(log_data[:self.hashed_length]).digest() == self.hashed_start
+
+    def create(self, log_data: mmap.mmap):
+        """Start a new index file for the log"""
+        self.entries = []
+        self.hashed_length = min(len(log_data), self.HASHED_LENGTH)
+        self.hashed_start = hashlib.sha1(log_data[:self.hashed_length]).digest()
+        with open(self.index_path + ".tmp", "wb") as index_file:
+            index_file.write(self.HEADER.pack(self.MAGIC, self.interval, self.hashed_length, self.hashed_start))
+        os.replace(self.index_path + ".tmp", self.index_path)
+
+    def find_timestamp(self, log_data: mmap.mmap, offset: int, end: int, previous_timestamp: float, max_lines: int = 16) -> float:
+        """Get the timestamp of the first line with one at or after offset, lines without(eg a traceback) belong to the line before"""
+        for _ in range(max_lines):
+            if offset >= end:
+                break
+            newline = log_data.find(b"\n", offset, end)
+            timestamp = self.parse_timestamp(log_data[offset:newline if newline != -1 else end])
+            if timestamp is not None:
+                return timestamp
+            offset = newline + 1
+        return previous_timestamp
+
+    def get_start_entry(self, start_timestamp: float):
+        """Get the last index entry where all the lines before it are older than start_timestamp"""
+        entries = [entry for entry in self.entries if entry[2] is not None]
+        position = bisect.bisect_left([entry[2] for entry in entries], start_timestamp)
+        if position == 0:
+            return self.entries[0]
+        return entries[position - 1]
+
+    def read_lines(self, offset: int = 0, line_number: int = 0):
+        """Yield (line number, byte offset, line) for the complete lines from offset to the end of the log"""
+        with open(self.log_path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as log_data:
+            end = log_data.rfind(b"\n") + 1
+            while offset < end:
+                newline = log_data.find(b"\n", offset, end)
+                yield line_number, offset, log_data[offset:newline]
+                offset = newline + 1
+                line_number += 1
+
+    def search_time_range(self, start = None, end = None):
+        """Yield (line number, line) for each line from start up to and including end,
+        start and end can be datetimes, strings such as "2024-05-01 10:00" or seconds since the epoch.
+        Assumes the timestamps in the log are increasing
+        """
+        self.update()
+        if len(self.entries) == 0:
+            return
+        start_timestamp, end_timestamp = to_timestamp(start), to_timestamp(end)
+        offset, line_number, _ = self.get_start_entry(start_timestamp) if start_timestamp is not None else self.entries[0]
+
+        timestamp = None
+        for line_number, _, line in self.read_lines(offset, line_number):
+            line_timestamp = self.parse_timestamp(line)
+            timestamp = line_timestamp if line_timestamp is not None else timestamp
+            if end_timestamp is not None and timestamp is not None and timestamp > end_timestamp:
+                break
+            if start_timestamp is None or (timestamp is not None and timestamp >= start_timestamp):
+                yield line_number, line.rstrip(b"\r").decode(errors="replace")
+
+    def search(self, text: str, start = None, end = None, max_results: int = None):
+        """Yield (line number, line) for each line containing text, optionally only within a time range(see search_time_range)"""
+        needle = text.encode()
+        result_count = 0
+        if start is not None or end is not None:
+            for line_number, line in self.search_time_range(start, end):
+                if text in line:
+                    yield line_number, line
+                    result_count += 1
+                    if max_results is not None and result_count >= max_results:
+                        return
+            return
+
+        self.update()
+        if len(self.entries) == 0:
+            return
+        entry_offsets = [entry[0] for entry in self.entries]
+        with open(self.log_path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as log_data:
+            end_offset = log_data.rfind(b"\n") + 1
+            counted_offset, counted_line_number = 0, 0
+            position = 0
+            while True:
+                # Let mmap find the text, instead of splitting the whole file into lines
+                match = log_data.find(needle, position, end_offset)
+                if match == -1:
+                    break
+                line_start = log_data.rfind(b"\n", 0, match) + 1
+                line_end = log_data.find(b"\n", match, end_offset)
+
+                # Count the lines from the closest index entry before the match
+                entry_position = bisect.bisect_right(entry_offsets, line_start) - 1
+                if entry_offsets[entry_position] > counted_offset:
+                    counted_offset, counted_line_number = self.entries[entry_position][0], self.entries[entry_position][1]
+                counted_line_number += log_data[counted_offset:line_start].count(b"\n")
+                counted_offset = line_start
+
+                yield counted_line_number, log_data[line_start:line_end].rstrip(b"\r").decode(errors="replace")
+                result_count += 1
+                if max_results is not None and result_count >= max_results:
+                    return
+                position = line_end + 1
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Search a log file by time range and/or text, using a sparse index stored next to it")
+    parser.add_argument("log_path")
+    parser.add_argument("--from", dest="start", default=None, help='eg "2024-05-01 10:00"')
+    parser.add_argument("--to", dest="end", default=None, help='eg "2024-05-01 10:05:30"')
+    parser.add_argument("--grep", default=None, help="Only print the lines containing this text")
+    parser.add_argument("--max", type=int, default=None, help="Stop after this many lines")
+    parser.add_argument("--line-numbers", "-n", action="store_true")
+    parser.add_argument("--interval", type=int, default=64 * 1024, help="Bytes between each index entry")
+    parser.add_argument("--reindex", action="store_true", help="Rebuild the index from scratch")
+    args = parser.parse_args()
+
+    log_index = LogIndex(args.log_path, interval=args.interval)
+    if args.reindex and os.path.exists(log_index.index_path):
+        os.remove(log_index.index_path)
+
+    if args.grep is not None:
+        results = log_index.search(args.grep, start=args.start, end=args.end, max_results=args.max)
+    else:
+        results = log_index.search_time_range(args.start, args.end)
+
+    try:
+        for result_count, (line_number, line) in enumerate(results):
+            if args.max is not None and result_count >= args.max:
+                break
+            print(f"{line_number + 1}:{line}" if args.line_numbers else line)
+    except BrokenPipeError: # eg when piped to head
+        pass
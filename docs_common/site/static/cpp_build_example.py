@@ -11,5 +11,7 @@ for linux: sudo apt install gcc
 
 cpp_files = [path_traverse_up(__file__, 0) + "/main.cpp"]
 build_setup = BuildSetup(cpp_file_paths=cpp_files)
+build_setup.enable_incremental_build() # Only recompile the files that changed since the last build
+build_setup.set_profile("debug") # Or "release", "size" or "native"
 
 build_setup.build_and_run()
\ No newline at end of file
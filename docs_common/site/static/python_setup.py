@@ -3,10 +3,18 @@ import sys, pathlib
 sys.path.append(str(pathlib.Path(__file__).resolve().parents[0]))
 
 import os
+import re
 from typing import List
 import subprocess, threading
 import platform
+import select
 import time
+import queue
+import gzip
+import shutil
+import signal
+import socket
+import selectors
 
 def path_traverse_up(path: str, count: int) -> str:
     """Traverse the provided path upwards
@@ -183,8 +191,13 @@ def process_is_running(p: subprocess.Popen):
 
 
 def terminate_process_and_all_its_children(p: subprocess.Popen):
-    import psutil
     pid = p.pid
+    if platform.system() != "Windows" and process_is_running(p) and os.getpgid(pid) == pid:
+        # The process leads its own process group(start_new_session=True), so the whole group can be stopped at once
+        terminate_process_group(p)
+        return
+
+    import psutil
     try:
         parent = psutil.Process(pid)
         children = parent.children(recursive=True)  # Get all descendants
@@ -200,7 +213,15 @@ def terminate_process_and_all_its_children(p: subprocess.Popen):
         print(f"Process {pid} does not exist.")
 
 
-def invoke_python_file_using_subprocess(python_env_path: str, file_path: str, logfile_path: str = None) -> subprocess.Popen:
+def invoke_python_file_using_subprocess(python_env_path: str, file_path: str, logfile_path: str = None, capture_logs: bool = False, 
+                                        max_log_size_mb: float = 100, rotate_interval_seconds: float = None, backup_count: int = 10) -> subprocess.Popen:
+    """Start a python file in the background using the python in the virtual environment
+
+    If capture_logs is set, the output is read through a pipe and written to logfile_path by a background thread, 
+    which starts a new log file when it grows larger than max_log_size_mb or older than rotate_interval_seconds. 
+    The old log files are gzipped(eg server.log.20240501-100000.gz), and only the newest backup_count are kept. 
+    Otherwise the output is redirected to logfile_path by the shell, and the file grows without limit
+    """
     if not os.path.exists(python_env_path):
         print(f"invalid path: {python_env_path}")
 
@@ -212,7 +233,7 @@ def invoke_python_file_using_subprocess(python_env_path: str, file_path: str, lo
 
     command = ""
     my_os = platform.system()
-    if logfile_path:
+    if logfile_path and not capture_logs:
         if my_os == "Windows":
             command = f'powershell; &"{python_env_path}/Scripts/python" -u "{file_path}" > "{logfile_path}"'
         else:
@@ -223,40 +244,705 @@ def invoke_python_file_using_subprocess(python_env_path: str, file_path: str, lo
         else:
             command = f'"{python_env_path}/bin/python" -u "{file_path}"'
 
+    if logfile_path and capture_logs:
+        new_process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        log_writer = RotatingLogWriter(logfile_path, max_size_mb=max_log_size_mb, rotate_interval_seconds=rotate_interval_seconds, backup_count=backup_count)
+        new_process.log_capture = LogCapture(new_process.stdout, log_writer).start()
+        return new_process
+
     new_process = subprocess.Popen(command, shell=True)
     return new_process
 
 
-def print_logs_loop(log_files: List[str]):
-    """Continuously watch multiple log files"""
-    if type(log_files) == type(str("")):
-        log_files = [log_files]
-
-    log_file_last_size = dict()
-    for LOG_FILE in log_files:
-        log_file_last_size[LOG_FILE] = 0
+class RotatingLogWriter:
+    """Write to a log file, and move it to a new gzipped file when it gets too large or too old
 
-    while True:
-        time.sleep(1)  # Polling interval (adjust as needed)
-        for LOG_FILE in log_files:
+    The gzipping and removal of old files is done in a separate thread, so writing is never blocked by it
+    """
+    def __init__(self, log_file_path: str, max_size_mb: float = 100, rotate_interval_seconds: float = None, backup_count: int = 10):
+        self.log_file_path = os.path.abspath(log_file_path)
+        self.max_size = int(max_size_mb * 1024 * 1024) if max_size_mb else None
+        self.rotate_interval_seconds = rotate_interval_seconds
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+        self._compress_queue = queue.Queue()
+        self._compress_thread = threading.Thread(target=self._compress_loop, daemon=True)
+        self._compress_thread.start()
+
+        ensure_directory_exists(get_directory(self.log_file_path))
+        if os.path.exists(self.log_file_path) and os.path.getsize(self.log_file_path) > 0:
+            self.rotate(reopen=False) # Keep the logs from last time, instead of overwriting them
+        self._file = open(self.log_file_path, "wb")
+        self._size = 0
+        self._opened_time = time.time()
+
+    def write(self, data: bytes):
+        with self._lock:
+            self._write(data)
+
+    def _write(self, data: bytes):
+        while self.max_size and self._size + len(data) > self.max_size:
+            # Rotate after the last complete line that fits, so lines are not split between files
+            newline = data.rfind(b"\n", 0, self.max_size - self._size)
+            if newline == -1 and self._size > 0:
+                self.rotate() # The next line does not fit, start it in a new file
+                continue
+            # Only a single line longer than max_size is split
+            end = newline + 1 if newline != -1 else self.max_size
+            self._file.write(data[:end])
+            self._size += end
+            self.rotate()
+            data = data[end:]
+        self._file.write(data)
+        self._file.flush() # Let anyone tailing the log see it right away
+        self._size += len(data)
+
+    def rotate_if_old(self):
+        with self._lock:
+            if self.rotate_interval_seconds and self._size > 0 and time.time() - self._opened_time >= self.rotate_interval_seconds:
+                self.rotate()
+
+    def rotate(self, reopen: bool = True):
+        """Move the current log file to a timestamped file, that is then gzipped in the background"""
+        if reopen:
+            self._file.close()
+        segment_path = self.log_file_path + "." + time.strftime("%Y%m%d-%H%M%S")
+        index = 1
+        while os.path.exists(segment_path) or os.path.exists(segment_path + ".gz"):
+            segment_path = self.log_file_path + "." + time.strftime("%Y%m%d-%H%M%S") + "-" + str(index)
+            index += 1
+        os.replace(self.log_file_path, segment_path)
+        self._compress_queue.put(segment_path)
+        if reopen:
+            self._file = open(self.log_file_path, "wb")
+            self._size = 0
+            self._opened_time = time.time()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+        self._compress_queue.put(None)
+        self._compress_thread.join()
+
+    def _compress_loop(self):
+        while True:
+            segment_path = self._compress_queue.get()
+            if segment_path is None:
+                return
             try:
-                if os.path.exists(LOG_FILE):
-                    current_size = os.path.getsize(LOG_FILE)
-                    if current_size == 0:
-                        log_file_last_size[LOG_FILE] = 0
-                    if current_size > log_file_last_size[LOG_FILE]:  # Check if new data is added
-                        with open(LOG_FILE, "r") as log_file:
-                            log_file.seek(log_file_last_size[LOG_FILE])  # Start reading from last read position
-                            new_logs = log_file.read()
-                            log_file_last_size[LOG_FILE] = current_size
-                            print(new_logs[:-1]) # skip the last endl character
+                with open(segment_path, "rb") as segment_file, gzip.open(segment_path + ".gz.tmp", "wb") as compressed_file:
+                    shutil.copyfileobj(segment_file, compressed_file, 1024 * 1024)
+                os.replace(segment_path + ".gz.tmp", segment_path + ".gz")
+                os.remove(segment_path)
+                self._remove_old_segments()
             except Exception as e:
+                print(f"Error compressing log file {segment_path}: {e}")
+
+    def _remove_old_segments(self):
+        log_directory = get_directory(self.log_file_path)
+        prefix = pathlib.Path(self.log_file_path).name + "."
+        segment_names = [file_name for file_name in os.listdir(log_directory) if re.fullmatch(re.escape(prefix) + r"\d{8}-\d{6}(-\d+)?\.gz", file_name)]
+        # Oldest first, eg server.log.20240501-100000.gz, server.log.20240501-100000-1.gz, server.log.20240501-100001.gz
+        segment_names.sort(key=lambda file_name: (file_name[len(prefix):len(prefix) + 15], int(file_name[len(prefix) + 16:-3] or 0)))
+        for file_name in segment_names[:max(len(segment_names) - self.backup_count, 0)]:
+            os.remove(log_directory + "/" + file_name)
+
+
+class LogCapture:
+    """Read the output of a process from a pipe in one thread, and write it to a RotatingLogWriter in another,
+    so the process is never blocked by a slow disk or by a log file being rotated
+    """
+    def __init__(self, stream, log_writer: RotatingLogWriter, chunk_size: int = 65536):
+        self.stream = stream
+        self.log_writer = log_writer
+        self.chunk_size = chunk_size
+        self.max_write_size = 16 * chunk_size # How much of the queued output to join into one write
+        self.close_log_writer = True # Set to False to keep writing to the same log file from a restarted process
+        self._queue = queue.Queue() # Unbounded, reading from the pipe should never wait for the disk
+        self.reader_thread = threading.Thread(target=self._read_loop, daemon=True)
+        self.writer_thread = threading.Thread(target=self._write_loop, daemon=True)
+
+    def start(self) -> "LogCapture":
+        self.reader_thread.start()
+        self.writer_thread.start()
+        return self
+
+    def wait(self):
+        """Wait until the process has closed its output and everything is written"""
+        self.reader_thread.join()
+        self.writer_thread.join()
+
+    def _read_loop(self):
+        file_descriptor = self.stream.fileno()
+        try:
+            while True:
+                data = os.read(file_descriptor, self.chunk_size)
+                if not data:
+                    break
+                self._queue.put(data)
+        finally:
+            self._queue.put(None)
+
+    def _write_loop(self):
+        try:
+            while True:
+                try:
+                    data = self._queue.get(timeout=1.0)
+                except queue.Empty:
+                    self.log_writer.rotate_if_old()
+                    continue
+                if data is None:
+                    break
+
+                # Write what is waiting together, up to max_write_size at a time
+                chunks = [data]
+                write_size = len(data)
+                while not self._queue.empty() and chunks[-1] is not None and write_size < self.max_write_size:
+                    chunks.append(self._queue.get())
+                    write_size += len(chunks[-1] or b"")
+                finished = chunks[-1] is None
+                self.log_writer.write(b"".join([chunk for chunk in chunks if chunk is not None]))
+                self.log_writer.rotate_if_old()
+                if finished:
+                    break
+        finally:
+            if self.close_log_writer:
+                self.log_writer.close()
+
+
+def terminate_process_group(p: subprocess.Popen, timeout: float = 5):
+    """Stop a process started with start_new_session=True and everything it started, using SIGTERM and then SIGKILL after timeout seconds"""
+    try:
+        os.killpg(p.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    try:
+        p.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        pass
+    try:
+        os.killpg(p.pid, signal.SIGKILL) # Also any children that are still running
+    except ProcessLookupError:
+        pass
+    p.wait()
+
+
+class SupervisedProcess:
+    """A process started by ProcessSupervisor, and how it should be restarted"""
+    def __init__(self, name: str, command, cwd: str = None, env: dict = None, pass_fds = (), restart: bool = True, log_writer: RotatingLogWriter = None):
+        self.name = name
+        self.command = command
+        self.cwd = cwd
+        self.env = env
+        self.pass_fds = tuple(pass_fds)
+        self.restart = restart
+        self.log_writer = log_writer
+        self.log_capture: LogCapture = None # Writes the output of the current process to log_writer
+        self.process: subprocess.Popen = None
+        self.start_time = None
+        self.restart_count = 0
+        self.failure_count = 0 # Exits in a row that happened soon after starting, used for the backoff
+        self.restart_time = None # When the process should be started again, if it is waiting to be restarted
+        self.stopping = False
+
+
+class ProcessSupervisor:
+    """Keep named processes running, restarting them when they exit
+
+    - Each process is started in its own process group, so it can be stopped together with everything it started
+    - Exits are detected without polling, using a pidfd for each process on linux, or a thread waiting on each process otherwise
+    - A process that keeps exiting soon after starting is restarted after an increasing delay, 
+        from min_backoff up to max_backoff seconds. If it ran for at least reset_after seconds, it is restarted after min_backoff
+
+    Example:
+        supervisor = ProcessSupervisor()
+        supervisor.add_python_file("server", python_env_path, "server.py", log_file_path="server.log")
+        supervisor.run_forever() # Until ctrl+c
+    """
+    def __init__(self, min_backoff: float = 0.05, max_backoff: float = 30, reset_after: float = 10, stop_timeout: float = 5, on_exit = None):
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.reset_after = reset_after
+        self.stop_timeout = stop_timeout
+        self.on_exit = on_exit # Called with (name, return code) when a process exits by itself
+        self.processes = dict() # name -> SupervisedProcess
+        self._lock = threading.RLock()
+        self._selector = selectors.DefaultSelector()
+        self._use_pidfd = hasattr(os, "pidfd_open")
+        self._exited = queue.Queue() # (name, process) from the waiting threads, when pidfd is not available
+        self._wake_reader, self._wake_writer = socket.socketpair() # Sockets, since select only supports sockets on windows
+        self._wake_reader.setblocking(False)
+        self._selector.register(self._wake_reader, selectors.EVENT_READ, None)
+        self._closed = False
+        self._monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
+        self._monitor_thread.start()
+
+    def add(self, name: str, command, cwd: str = None, env: dict = None, pass_fds = (), restart: bool = True, 
+            log_file_path: str = None, max_log_size_mb: float = 100) -> SupervisedProcess:
+        """Start a process and keep it running
+
+        Parameters
+        ----------
+            name (str): Used to refer to the process, eg in stop(name)
+            command (str or List[str]): The command to run, a string is run using the shell
+            cwd (str): The directory to start the process in
+            env (dict): Environment variables to add
+            pass_fds: File descriptors the process should inherit, eg a listening socket
+            restart (bool): Restart the process when it exits
+            log_file_path (str): Write the output of the process to this file, rotating it when it grows larger than max_log_size_mb
+        """
+        with self._lock:
+            if name in self.processes:
+                raise Exception(f"there is already a process named {name}")
+            log_writer = RotatingLogWriter(log_file_path, max_size_mb=max_log_size_mb) if log_file_path else None
+            supervised_process = SupervisedProcess(name, command, cwd=cwd, env=env, pass_fds=pass_fds, restart=restart, log_writer=log_writer)
+            self.processes[name] = supervised_process
+            self._start(supervised_process)
+            return supervised_process
+
+    def add_python_file(self, name: str, python_env_path: str, file_path: str, **kwargs) -> SupervisedProcess:
+        """Start a python file using the python in the virtual environment, see add for the other arguments"""
+        if platform.system() == "Windows":
+            python_path = python_env_path + "/Scripts/python"
+        else:
+            python_path = python_env_path + "/bin/python"
+        kwargs.setdefault("cwd", get_directory(file_path))
+        return self.add(name, [python_path, "-u", file_path], **kwargs)
+
+    def is_running(self, name: str) -> bool:
+        with self._lock:
+            return name in self.processes and process_is_running(self.processes[name].process)
+
+    def restart(self, name: str):
+        """Stop the process and start it again right away"""
+        with self._lock:
+            supervised_process = self.processes[name]
+            supervised_process.stopping = True
+        self._terminate([supervised_process])
+        with self._lock:
+            supervised_process.stopping = False
+            supervised_process.failure_count = 0
+            self._start(supervised_process)
+
+    def stop(self, name: str):
+        """Stop the process and everything it started, and stop supervising it"""
+        with self._lock:
+            supervised_process = self.processes.pop(name)
+            supervised_process.stopping = True
+        self._terminate([supervised_process])
+        self._close_log(supervised_process)
+
+    def stop_all(self):
+        """Stop all the processes at the same time"""
+        with self._lock:
+            supervised_processes = list(self.processes.values())
+            self.processes = dict()
+            for supervised_process in supervised_processes:
+                supervised_process.stopping = True
+        self._terminate(supervised_processes)
+        for supervised_process in supervised_processes:
+            self._close_log(supervised_process)
+
+    def _close_log(self, supervised_process: SupervisedProcess):
+        # Let the log capture write what is left of the output first, the process has exited so its output ends soon
+        if supervised_process.log_capture:
+            supervised_process.log_capture.wait()
+        if supervised_process.log_writer:
+            supervised_process.log_writer.close()
+
+    def close(self):
+        self.stop_all()
+        self._closed = True
+        self._wake()
+        self._monitor_thread.join()
+        self._selector.close()
+        self._wake_reader.close()
+        self._wake_writer.close()
+
+    def run_forever(self):
+        """Block until ctrl+c, then stop all the processes"""
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            print("stopping all processes")
+        finally:
+            self.close()
+
+    def _start(self, supervised_process: SupervisedProcess):
+        env = None
+        if supervised_process.env:
+            env = dict(os.environ)
+            env.update(supervised_process.env)
+        output = subprocess.PIPE if supervised_process.log_writer else None
+        if platform.system() == "Windows":
+            process_group_arguments = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            process_group_arguments = {"start_new_session": True, "pass_fds": supervised_process.pass_fds}
+
+        supervised_process.restart_time = None
+        supervised_process.start_time = time.monotonic()
+        try:
+            process = subprocess.Popen(supervised_process.command, shell=isinstance(supervised_process.command, str), cwd=supervised_process.cwd, env=env,
+                                       stdout=output, stderr=subprocess.STDOUT if output else None, **process_group_arguments)
+        except OSError as e:
+            print(f"failed to start {supervised_process.name}: {e}")
+            self._schedule_restart(supervised_process)
+            return
+        supervised_process.process = process
+
+        if supervised_process.log_writer:
+            # Only one log capture should write to the log writer at a time, the previous process has already exited
+            if supervised_process.log_capture:
+                supervised_process.log_capture.wait()
+            supervised_process.log_capture = LogCapture(process.stdout, supervised_process.log_writer)
+            supervised_process.log_capture.close_log_writer = False
+            supervised_process.log_capture.start()
+
+        if self._use_pidfd:
+            try:
+                pidfd = os.pidfd_open(process.pid)
+                self._selector.register(pidfd, selectors.EVENT_READ, (supervised_process.name, process))
+                return
+            except OSError:
+                self._use_pidfd = False # eg linux older than 5.3
+        threading.Thread(target=self._wait_for_exit, args=(supervised_process.name, process), daemon=True).start()
+
+    def _wait_for_exit(self, name: str, process: subprocess.Popen):
+        process.wait()
+        self._exited.put((name, process))
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_writer.send(b"x")
+        except OSError:
+            pass
+
+    def _schedule_restart(self, supervised_process: SupervisedProcess):
+        if supervised_process.start_time is not None and time.monotonic() - supervised_process.start_time >= self.reset_after:
+            supervised_process.failure_count = 0
+        delay = min(self.max_backoff, self.min_backoff * (2 ** supervised_process.failure_count))
+        supervised_process.failure_count += 1
+        supervised_process.restart_time = time.monotonic() + delay
+        self._wake() # Let the monitor thread wait for the new restart time, eg when the process failed to start in add()
+        print(f"restarting {supervised_process.name} in {delay:.2f}s")
+
+    def _handle_exit(self, name: str, process: subprocess.Popen):
+        return_code = process.wait()
+        with self._lock:
+            supervised_process = self.processes.get(name)
+            if supervised_process is None or supervised_process.process is not process or supervised_process.stopping:
+                return # Stopped on purpose, or an older process that was already replaced
+            print(f"{name} exited with code {return_code}")
+            if platform.system() != "Windows":
+                try:
+                    os.killpg(process.pid, signal.SIGKILL) # Anything it started that is still running
+                except (ProcessLookupError, PermissionError):
+                    pass
+            if supervised_process.restart:
+                supervised_process.restart_count += 1
+                self._schedule_restart(supervised_process)
+        if self.on_exit:
+            self.on_exit(name, return_code)
+
+    def _monitor_loop(self):
+        while not self._closed:
+            with self._lock:
+                restart_times = [supervised_process.restart_time for supervised_process in self.processes.values() if supervised_process.restart_time is not None]
+            timeout = max(min(restart_times) - time.monotonic(), 0) if len(restart_times) > 0 else None
+
+            for key, _ in self._selector.select(timeout):
+                if key.data is None:
+                    try:
+                        self._wake_reader.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                # A pidfd becomes readable when the process exits
+                self._selector.unregister(key.fileobj)
+                os.close(key.fileobj)
+                self._handle_exit(*key.data)
+
+            while not self._exited.empty():
+                self._handle_exit(*self._exited.get())
+
+            with self._lock:
+                for supervised_process in self.processes.values():
+                    if supervised_process.restart_time is not None and supervised_process.restart_time <= time.monotonic():
+                        self._start(supervised_process)
+
+    def _terminate(self, supervised_processes: List[SupervisedProcess]):
+        """Stop the process groups, first all of them using SIGTERM, then SIGKILL for the ones still running after stop_timeout"""
+        running_processes = [supervised_process.process for supervised_process in supervised_processes if process_is_running(supervised_process.process)]
+        for supervised_process in supervised_processes:
+            supervised_process.restart_time = None
+        if platform.system() == "Windows":
+            for process in running_processes:
+                terminate_process_and_all_its_children(process)
+            return
+
+        for process in running_processes:
+            try:
+                os.killpg(process.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.stop_timeout
+        for process in running_processes:
+            try:
+                process.wait(timeout=max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                pass
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+            process.wait()
+
+
+class WorkerPool:
+    """Run several copies of a server script on the same port, so requests are handled by all the cores
+
+    Each worker gets the environment variables WORKER_INDEX and WORKER_COUNT, and gets the socket to serve on using get_worker_socket()
+    - shared socket(default): the pool opens the listening socket once and every worker inherits it. 
+        Connections wait in the socket while a worker restarts, so none are dropped
+    - reuse_port(linux): each worker opens its own socket on the port with SO_REUSEPORT, and the kernel spreads the connections evenly. 
+        Connections waiting for a worker that is restarting are reset
+
+    Example:
+        supervisor = ProcessSupervisor()
+        pool = WorkerPool(supervisor, "api", python_env_path, "server.py", port=5002, log_directory="logs")
+        supervisor.run_forever()
+    """
+    def __init__(self, supervisor: ProcessSupervisor, name: str, python_env_path: str, file_path: str, worker_count: int = None,
+                 host: str = "127.0.0.1", port: int = 8000, reuse_port: bool = False, log_directory: str = None):
+        self.supervisor = supervisor
+        self.name = name
+        self.worker_count = worker_count or os.cpu_count() or 1
+        self.host = host
+        self.port = port
+        self.reuse_port = reuse_port
+        self.listening_socket: socket.socket = None
+
+        if platform.system() == "Windows":
+            raise Exception("WorkerPool is not supported on windows, since the workers can not inherit the listening socket")
+
+        env = {"WORKER_COUNT": str(self.worker_count), "WORKER_HOST": host, "WORKER_PORT": str(port)}
+        pass_fds = ()
+        if reuse_port:
+            env["WORKER_REUSE_PORT"] = "1"
+        else:
+            self.listening_socket = create_listening_socket(host, port)
+            env["WORKER_LISTEN_FD"] = str(self.listening_socket.fileno())
+            pass_fds = (self.listening_socket.fileno(),)
+
+        for worker_index in range(self.worker_count):
+            worker_env = dict(env)
+            worker_env["WORKER_INDEX"] = str(worker_index)
+            log_file_path = f"{log_directory}/{name}-{worker_index}.log" if log_directory else None
+            supervisor.add_python_file(self.get_worker_name(worker_index), python_env_path, file_path, env=worker_env, pass_fds=pass_fds, log_file_path=log_file_path)
+
+    def get_worker_name(self, worker_index: int) -> str:
+        return f"{self.name}-{worker_index}"
+
+    def restart_worker(self, worker_index: int):
+        """Restart a single worker, the others keep handling requests"""
+        self.supervisor.restart(self.get_worker_name(worker_index))
+
+    def restart_all(self, delay_seconds: float = 1.0):
+        """Restart the workers one at a time(eg after updating the code), so there is always someone handling requests
+
+        Parameters
+        ----------
+            delay_seconds (float): Time for each restarted worker to start listening, before restarting the next one
+        """
+        for worker_index in range(self.worker_count):
+            if worker_index > 0:
+                time.sleep(delay_seconds)
+            self.restart_worker(worker_index)
+
+    def stop(self):
+        for worker_index in range(self.worker_count):
+            self.supervisor.stop(self.get_worker_name(worker_index))
+        if self.listening_socket:
+            self.listening_socket.close()
+            self.listening_socket = None
+
+
+def create_listening_socket(host: str, port: int, reuse_port: bool = False, backlog: int = 1024) -> socket.socket:
+    listening_socket = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    listening_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        listening_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    listening_socket.bind((host, port))
+    listening_socket.listen(backlog)
+    return listening_socket
+
+
+def get_worker_index() -> int:
+    """In a worker started by WorkerPool, get which worker this is(0 to WORKER_COUNT - 1), or 0 if not started by a WorkerPool"""
+    return int(os.environ.get("WORKER_INDEX", "0"))
+
+
+def get_worker_socket(host: str = "127.0.0.1", port: int = 8000) -> socket.socket:
+    """In a worker started by WorkerPool, get the listening socket to serve on. 
+    If not started by a WorkerPool, a socket listening on host and port is created
+    """
+    if "WORKER_LISTEN_FD" in os.environ:
+        return socket.socket(fileno=int(os.environ["WORKER_LISTEN_FD"]))
+    if os.environ.get("WORKER_REUSE_PORT") == "1":
+        return create_listening_socket(os.environ["WORKER_HOST"], int(os.environ["WORKER_PORT"]), reuse_port=True)
+    return create_listening_socket(host, port)
+
+
+def run_flask_worker(app, host: str = "127.0.0.1", port: int = 8000, threaded: bool = True):
+    """Serve a flask app on the socket from get_worker_socket, so the same script works both in a WorkerPool and on its own"""
+    from werkzeug.serving import make_server
+    worker_socket = get_worker_socket(host, port)
+    host, port = worker_socket.getsockname()[:2]
+    print(f"worker {get_worker_index()} serving on {host}:{port}")
+    make_server(host, port, app, threaded=threaded, fd=worker_socket.fileno()).serve_forever()
+
+
+class LogTailer:
+    """Follow log files like tail -F, calling on_line for each complete line that is written to them
+
+    - Waits for changes using inotify on linux(using Inotify from cpp_build.py, if it is next to this file), 
+      and checks the files every poll_interval seconds otherwise
+    - Keeps the files open, and reads at most chunk_size bytes at a time
+    - Starts over if a file is truncated, and follows it if it is rotated(renamed and recreated)
+    """
+    def __init__(self, log_files: List[str], on_line = None, chunk_size: int = 65536, poll_interval: float = 1.0, max_line_length: int = 1024 * 1024):
+        if type(log_files) == type(str("")):
+            log_files = [log_files]
+        self.log_files = [os.path.abspath(log_file) for log_file in log_files]
+        # The path inotify reports for each log file, which has the symlinks in the directory resolved
+        self._watched_paths = dict([(os.path.join(os.path.realpath(os.path.dirname(log_file)), os.path.basename(log_file)), log_file) for log_file in self.log_files])
+        self.on_line = on_line or (lambda log_file, line: print(line))
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self.max_line_length = max_line_length # Longer lines are split, so a file without newlines can not use up the memory
+        self.files = dict() # log file -> {"file", "inode", "position", "partial_line"}
+        self.thread: threading.Thread = None
+        self._stop_event = threading.Event()
+        self._wake_read_fd, self._wake_write_fd = os.pipe()
+
+    def start(self) -> "LogTailer":
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self._stop_event.is_set():
+            return
+        self._stop_event.set()
+        if self.thread and self.thread is not threading.current_thread():
+            os.write(self._wake_write_fd, b"x") # Wake up the thread if it is waiting for changes
+            self.thread.join()
+        # The thread is not using the pipe anymore, if stop was called from on_line it stops before waiting again
+        os.close(self._wake_read_fd)
+        os.close(self._wake_write_fd)
+
+    def run(self):
+        inotify = None
+        if platform.system() == "Linux":
+            try:
+                from cpp_build import Inotify
+                inotify = Inotify()
+                for directory in set([os.path.dirname(watched_path) for watched_path in self._watched_paths]):
+                    inotify.add_watch(directory, Inotify.IN_MODIFY | Inotify.IN_MOVED_FROM | Inotify.IN_MOVED_TO | Inotify.IN_CREATE | Inotify.IN_DELETE)
+            except (ImportError, OSError, AttributeError):
+                inotify = None
+
+        try:
+            for log_file in self.log_files:
+                self.read_new_lines(log_file)
+
+            while not self._stop_event.is_set():
+                if inotify:
+                    # Also check all the files now and then, in case an event was missed(eg on network file systems)
+                    readable, _, _ = select.select([inotify, self._wake_read_fd], [], [], self.poll_interval * 10)
+                    changed_files = set([self._watched_paths.get(file_path) for file_path in inotify.read_events(timeout=0)]) if inotify in readable else set(self.log_files)
+                else:
+                    self._stop_event.wait(self.poll_interval)
+                    changed_files = set(self.log_files)
+
+                for log_file in self.log_files:
+                    if log_file in changed_files and not self._stop_event.is_set():
+                        self.read_new_lines(log_file)
+        finally:
+            if inotify:
+                inotify.close()
+            for state in self.files.values():
+                state["file"].close()
+            self.files = dict()
+
+    def read_new_lines(self, log_file: str):
+        try:
+            file_stat = os.stat(log_file)
+        except FileNotFoundError:
+            file_stat = None
+
+        state = self.files.get(log_file)
+        if file_stat is None:
+            # The file was rotated or removed, keep reading the old file until a new one is created
+            if state:
+                self.read_chunks(log_file, state)
+            return
+
+        if state and (file_stat.st_dev, file_stat.st_ino) != state["inode"]:
+            # A new file was created, read what is left of the old file before switching to the new one
+            self.read_chunks(log_file, state)
+            if len(state["partial_line"]) > 0:
+                self.emit_line(log_file, state["partial_line"])
+            state["file"].close()
+            del self.files[log_file]
+            state = None
+
+        if state is None:
+            try:
+                state = {"file": open(log_file, "rb"), "inode": (file_stat.st_dev, file_stat.st_ino), "position": 0, "partial_line": b""}
+            except OSError as e:
                 print(f"Error reading logs: {e}")
+                return
+            self.files[log_file] = state
+        elif file_stat.st_size < state["position"]:
+            # The file was truncated, start over from the beginning
+            state["file"].seek(0)
+            state["position"] = 0
+            state["partial_line"] = b""
+
+        self.read_chunks(log_file, state)
+
+    def read_chunks(self, log_file: str, state: dict):
+        while not self._stop_event.is_set():
+            chunk = state["file"].read(self.chunk_size)
+            if not chunk:
+                return
+            state["position"] += len(chunk)
+            lines = (state["partial_line"] + chunk).split(b"\n")
+            state["partial_line"] = lines.pop() # Wait for the rest of the last line
+            if len(state["partial_line"]) > self.max_line_length:
+                lines.append(state["partial_line"])
+                state["partial_line"] = b""
+            for line in lines:
+                self.emit_line(log_file, line)
+
+    def emit_line(self, log_file: str, line: bytes):
+        try:
+            self.on_line(log_file, line.rstrip(b"\r").decode(errors="replace"))
+        except Exception as e:
+            print(f"Error handling log line: {e}")
+
+
+def print_logs_loop(log_files: List[str]):
+    """Continuously watch multiple log files"""
+    LogTailer(log_files).run()
 
-# Print out the contents of the log files in real time
-def create_log_file_tail_thread(log_files: List[str]):
+# Print out the contents of the log files in real time, call stop() on the returned tailer to stop
+def create_log_file_tail_thread(log_files: List[str]) -> LogTailer:
     print("tail_log_files")
-    return threading.Thread(target=print_logs_loop, daemon=True, args=(log_files,)).start();
+    return LogTailer(log_files).start()
 
 if __name__ == "__main__":
     # Activate environment
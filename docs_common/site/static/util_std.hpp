@@ -95,6 +95,72 @@ struct TestClass {
         }
         std::cout << "All tests passed!" << std::endl;
     }
+    static void list_tests() {
+        if(!__test_map__) {
+            return;
+        }
+        for(__test_map_type__::iterator it = __test_map__->begin(); it != __test_map__->end(); it++) {
+            std::cout << it->first << std::endl;
+        }
+    }
+    static bool run_test(std::string test_name) {
+        if(!__test_map__ || __test_map__->count(test_name) == 0) {
+            std::cout << "No test named: " << test_name << std::endl;
+            return false;
+        }
+        try {
+            (*__test_map__)[test_name]->test();
+        }
+        catch (const std::exception& e) {
+            std::cout << "caught error" << std::endl;
+            std::cout << e.what() << std::endl; // information from error printed
+            return false;
+        }
+        catch(...) {
+            std::cout << "caught unknown error" << std::endl;
+            return false;
+        }
+        return true;
+    }
+    /*
+    Run several tests in the same process, to avoid starting a new process for each test
+    Each test is surrounded by lines that cpp_test_runner.py uses to split the output between the tests:
+        <<<<<<< start test: <name>
+        <<<<<<< end test: <name> <passed/failed> <seconds>
+    */
+    static bool run_test_batch(std::vector<std::string> test_names) {
+        bool all_passed = true;
+        for(int i = 0; i < test_names.size(); i++) {
+            std::cout << "<<<<<<< start test: " << test_names[i] << std::endl;
+            std::chrono::steady_clock::time_point start_time = std::chrono::steady_clock::now();
+            bool passed = run_test(test_names[i]);
+            double duration = std::chrono::duration<double>(std::chrono::steady_clock::now() - start_time).count();
+            std::cout << std::endl << "<<<<<<< end test: " << test_names[i] << " " << (passed ? "passed" : "failed") << " " << duration << std::endl;
+            all_passed = all_passed && passed;
+        }
+        return all_passed;
+    }
+    /*
+    Run the tests as specified by the command line arguments, used by cpp_test_runner.py
+        --list-tests        print the name of each test, one per line
+        --run-test <name>   only run the test with the name, returns 0 if it passed
+        --run-tests <name>...   run the tests with the names in the same process, see run_test_batch
+        (no arguments)      run all tests
+    */
+    static int run_tests_from_arguments(int argc, char** argv) {
+        if(argc >= 2 && std::string(argv[1]) == "--list-tests") {
+            list_tests();
+            return 0;
+        }
+        if(argc >= 3 && std::string(argv[1]) == "--run-test") {
+            return run_test(argv[2]) ? 0 : 1;
+        }
+        if(argc >= 3 && std::string(argv[1]) == "--run-tests") {
+            return run_test_batch(std::vector<std::string>(argv + 2, argv + argc)) ? 0 : 1;
+        }
+        run_all_tests();
+        return 0;
+    }
 };
 
 #define TestWrapper(test_name, func) \
@@ -132,10 +198,9 @@ void TEST_add_() {
 }
 AddTest(TEST_add_);
 
-// Run all tests
-int main() {
-    vicmil::TestClass::run_all_tests();
-    return 0;
+// Run all tests, or the ones selected by the command line arguments
+int main(int argc, char** argv) {
+    return vicmil::TestClass::run_tests_from_arguments(argc, argv);
 }
 
 /*